@@ -0,0 +1,67 @@
+"""
+Console stand-in: a socket pair whose far end streams a recorded console log,
+as QEMU does on the serial chardev.
+"""
+
+import socket
+import threading
+import time
+
+
+def recorded_log(lines: int, marker_every: int = 100) -> bytes:
+    """
+    A kernel-like boot log of the given number of lines, with "marker N" on every marker_every-th line.
+    """
+    out = []
+    for i in range(lines):
+        stamp = f"[{i / 1000:12.6f}]"
+        if i % marker_every == marker_every - 1:
+            out.append(f"{stamp} marker {i // marker_every}\r\n")
+        else:
+            out.append(f"{stamp} sched: task {i % 97} woke on cpu {i % 4}, pending={i * 7 % 4096:#x}\r\n")
+    return "".join(out).encode()
+
+
+class FakeVM:
+    """
+    Just enough of QEMUMachine for autograder.qemu.console.
+    """
+
+    def __init__(self, console_socket: socket.socket):
+        self.console_socket = console_socket
+
+
+class ConsoleFeeder:
+    """
+    Streams data into a socket pair at rate bytes per second (0: as fast as it is read).
+    """
+
+    def __init__(self, data: bytes, rate: float = 0.0, chunk_size: int = 4096):
+        self.data = data
+        self.rate = rate
+        self.chunk_size = chunk_size
+        self.vm_socket, self._peer = socket.socketpair()
+        self.vm = FakeVM(self.vm_socket)
+        self._thread = threading.Thread(target=self._run, name="console-feeder", daemon=True)
+
+    def start(self) -> "ConsoleFeeder":
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        start = time.monotonic()
+        try:
+            for pos in range(0, len(self.data), self.chunk_size):
+                if self.rate:
+                    delay = start + pos / self.rate - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                self._peer.sendall(self.data[pos : pos + self.chunk_size])
+        except OSError:
+            # the reader went away
+            pass
+
+    def close(self) -> None:
+        self._peer.close()
+        self._thread.join()
+        self.vm_socket.close()
@@ -0,0 +1,102 @@
+"""
+GDB/MI replayer standing in for gdb-multiarch in the benchmarks.
+
+Answers the MI commands the harness sends with canned records shaped like the
+ones GDB sends for a RISC-V kernel stopped in QEMU, without any target behind it.
+
+    python fake_gdb.py [--stop-delay SECONDS] [--stream-lines N] [--notify N] [--probe-hits N]
+
+Breakpoints given commands with -break-commands act as counter probes: every
+continue hits each of them --probe-hits times, GDB-style, before the final stop.
+"""
+
+import argparse
+import re
+import sys
+import time
+
+REGISTERS = ["zero", "ra", "sp", "gp", "tp", "pc", "sstatus", "sie", "stvec", "sepc", "scause", "stval", "sip", "satp"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stop-delay", type=float, default=0.0, help="seconds between *running and *stopped")
+    parser.add_argument("--stream-lines", type=int, default=0, help="console stream records before each result")
+    parser.add_argument("--notify", type=int, default=0, help="=notify records sent with every stop")
+    parser.add_argument("--probe-hits", type=int, default=0, help="hits of each probe per continue")
+    # accepted for the command line of the real GDB, MI is all this speaks
+    parser.add_argument("--interpreter", default="mi3")
+    args = parser.parse_args()
+
+    out = sys.stdout
+
+    def send(*records: str) -> None:
+        out.write("\n".join(records) + "\n(gdb) \n")
+        out.flush()
+
+    send('=thread-group-added,id="i1"')
+    numbers = iter(range(1, 1 << 30))
+    # breakpoint number -> hits
+    times: dict[str, int] = {}
+    # breakpoint number -> commands, for the probes
+    commands: dict[str, list[str]] = {}
+    for line in sys.stdin:
+        tok, cmd, rest = re.match(r"(\d*)(\S+)\s*(.*)", line.strip()).groups()
+        stream = [f'~"stream line {i}\\n"' for i in range(args.stream_lines)]
+        if cmd == "-exec-continue":
+            send(f"{tok}^running", '*running,thread-id="all"')
+            for number, lines in commands.items():
+                printf = any(line.startswith("printf") for line in lines)
+                for _ in range(args.probe_hits):
+                    times[number] += 1
+                    send(
+                        f'*stopped,reason="breakpoint-hit",disp="keep",bkptno="{number}",'
+                        'frame={addr="0x80201000",func="printk",args=[]},thread-id="1",stopped-threads="all"',
+                        f'=breakpoint-modified,bkpt={{number="{number}",type="breakpoint",times="{times[number]}"}}',
+                        *([f'~"@probe {number}: hit {times[number]}\\n"'] if printf else []),
+                        '*running,thread-id="all"',
+                    )
+            if args.stop_delay:
+                time.sleep(args.stop_delay)
+            notify = [f'=library-loaded,id="lib{i}",target-name="lib{i}"' for i in range(args.notify)]
+            send(
+                *notify,
+                '*stopped,reason="breakpoint-hit",disp="keep",bkptno="1",'
+                'frame={addr="0x80200000",func="_start",args=[]},thread-id="1",stopped-threads="all"',
+            )
+        elif cmd == "-break-insert":
+            number = str(next(numbers))
+            times[number] = 0
+            send(
+                *stream,
+                f'{tok}^done,bkpt={{number="{number}",type="breakpoint",disp="keep",enabled="y",'
+                f'addr="0x80200000",func="_start",times="0"}}',
+            )
+        elif cmd == "-break-commands":
+            number, _, lines = rest.partition(" ")
+            commands[number] = re.findall(r'"((?:[^"\\]|\\.)*)"', lines)
+            send(f"{tok}^done")
+        elif cmd == "-break-delete":
+            for number in rest.split():
+                times.pop(number, None)
+                commands.pop(number, None)
+            send(f"{tok}^done")
+        elif cmd == "-break-list":
+            body = ",".join(f'bkpt={{number="{n}",type="breakpoint",times="{t}"}}' for n, t in times.items())
+            send(f'{tok}^done,BreakpointTable={{nr_rows="{len(times)}",nr_cols="6",hdr=[],body=[{body}]}}')
+        elif cmd == "-data-list-register-names":
+            names = ",".join(f'"{name}"' for name in REGISTERS)
+            send(*stream, f"{tok}^done,register-names=[{names}]")
+        elif cmd == "-data-list-register-values":
+            regnums = [int(n) for n in rest.split()[1:]] or list(range(len(REGISTERS)))
+            values = ",".join(f'{{number="{n}",value="0x{0x80200000 + n * 8:x}"}}' for n in regnums)
+            send(*stream, f"{tok}^done,register-values=[{values}]")
+        elif cmd == "-gdb-exit":
+            send(f"{tok}^exit")
+            break
+        else:
+            send(*stream, f"{tok}^done")
+
+
+if __name__ == "__main__":
+    main()
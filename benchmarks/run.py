@@ -0,0 +1,239 @@
+"""
+Benchmarks of the harness itself, against local stand-ins for QEMU and GDB.
+
+The console benchmarks stream a recorded (or generated) boot log through a socket
+pair; the GDB benchmarks drive fake_gdb.py, an MI replayer, through a real
+GdbSession. Every benchmark reports throughput and p50/p90/p99 latency, so runs
+before and after a change can be compared.
+
+    python benchmarks/run.py [--lines 100000] [--stops 2000] [--json out.json] [only ...]
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from fake_console import ConsoleFeeder, recorded_log  # noqa: E402
+
+import autograder.gdb as g  # noqa: E402
+from autograder import timing  # noqa: E402
+from autograder.gdb.records import record  # noqa: E402
+from autograder.gdb.session import GdbSession  # noqa: E402
+from autograder.qemu import console  # noqa: E402
+
+FAKE_GDB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_gdb.py")
+
+
+class BenchTest:
+    """
+    Stands in for a QemuGdbTest: the attributes the harness functions use.
+    """
+
+    def __init__(self, vm=None, gdb=None):
+        self.vm = vm
+        self.gdb = gdb
+        self.log = logging.getLogger("bench")
+        self.gdb_log = logging.getLogger("bench.gdb")
+
+    def id(self) -> str:
+        return "benchmark"
+
+    def fail(self, msg: str):
+        raise AssertionError(msg)
+
+
+def report(results: dict, name: str, samples: list[float], items: int | None = None, unit: str = "op") -> None:
+    """
+    Print and collect throughput and latency percentiles of samples (seconds per operation).
+    items counts what the throughput is measured in, e.g. console bytes, if not one per sample.
+    """
+    total = sum(samples)
+    q = statistics.quantiles(samples, n=100, method="inclusive") if len(samples) > 1 else samples * 99
+    row = {
+        "count": len(samples),
+        "total": total,
+        "throughput": (items if items is not None else len(samples)) / total if total else float("inf"),
+        "unit": unit,
+        "p50": q[49],
+        "p90": q[89],
+        "p99": q[98],
+    }
+    results[name] = row
+    print(
+        f"{name:<34} {row['count']:>8} {row['throughput']:>14.1f} {unit}/s "
+        f"p50 {row['p50'] * 1e6:>9.1f}us p90 {row['p90'] * 1e6:>9.1f}us p99 {row['p99'] * 1e6:>9.1f}us"
+    )
+    # keep the timing records of the harness from piling up across benchmarks
+    timing.take()
+
+
+def bench_console(args, results: dict) -> None:
+    if args.console_log:
+        with open(args.console_log, "rb") as f:
+            data = f.read()
+        waits = [line.strip() for line in data.splitlines() if line.strip()][:: args.marker_every]
+    else:
+        data = recorded_log(args.lines, args.marker_every)
+        waits = [f"marker {k}\r".encode() for k in range(args.lines // args.marker_every)]
+
+    for kind in ("literal", "regex"):
+        patterns = waits if kind == "literal" else [re.compile(re.escape(p)) for p in waits]
+        feeder = ConsoleFeeder(data, rate=args.rate).start()
+        test = BenchTest(vm=feeder.vm)
+        samples = []
+        for pattern in patterns:
+            start = time.perf_counter()
+            console.wait_for_console_pattern(test, pattern, "Kernel panic", timeout=args.timeout)
+            samples.append(time.perf_counter() - start)
+        feeder.close()
+        report(results, f"console wait ({kind})", samples, items=len(data), unit="B")
+
+    feeder = ConsoleFeeder(data, rate=args.rate).start()
+    test = BenchTest(vm=feeder.vm)
+    start = time.perf_counter()
+    console.wait_for_console_patterns(test, waits[-3:], "Kernel panic", timeout=args.timeout)
+    feeder.close()
+    report(results, "console wait all-of", [time.perf_counter() - start], items=len(data), unit="B")
+
+
+def bench_gdb(args, results: dict) -> None:
+    command = [
+        sys.executable,
+        FAKE_GDB,
+        "--interpreter=mi3",
+        "--stream-lines",
+        str(args.stream_lines),
+        "--notify",
+        str(args.notify),
+    ]
+    session = GdbSession(command, logging.getLogger("bench.gdb"))
+    test = BenchTest(gdb=session)
+    try:
+        g.break_insert(test, g.locspec_address(0x80200000))
+
+        cont, sync, both = [], [], []
+        for _ in range(args.stops):
+            start = time.perf_counter()
+            g.exec_continue(test)
+            mid = time.perf_counter()
+            g.sync(test, timeout=args.timeout)
+            cont.append(mid - start)
+            sync.append(time.perf_counter() - mid)
+        for _ in range(args.stops):
+            start = time.perf_counter()
+            g.cont_sync(test, timeout=args.timeout)
+            both.append(time.perf_counter() - start)
+        report(results, "exec_continue", cont)
+        report(results, "sync", sync)
+        report(results, "cont_sync", both)
+
+        names = ["scause", "sip", "sie", "sepc"]
+        cold, warm, batch = [], [], []
+        for _ in range(args.stops):
+            session.register_cache.clear()
+            start = time.perf_counter()
+            g.info_register(test, "scause")
+            cold.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            g.info_register(test, "scause")
+            warm.append(time.perf_counter() - start)
+            session.register_cache.clear()
+            start = time.perf_counter()
+            g.registers(test, names)
+            batch.append(time.perf_counter() - start)
+        report(results, "info_register (cold)", cold)
+        report(results, "info_register (cached)", warm)
+        report(results, f"registers x{len(names)} (cold)", batch)
+    finally:
+        session.exit()
+
+
+def bench_probes(args, results: dict) -> None:
+    hits = args.stops
+    command = [sys.executable, FAKE_GDB, "--interpreter=mi3", "--probe-hits", str(hits)]
+    session = GdbSession(command, logging.getLogger("bench.probes"))
+    test = BenchTest(gdb=session)
+    try:
+        # counting with a stop and a continue per hit, the fake stops at breakpoint 1 on every continue
+        g.break_insert(test, g.locspec_address(0x80200000))
+        start = time.perf_counter()
+        for _ in range(hits):
+            g.cont_sync(test, timeout=args.timeout)
+        report(results, "count by stopping", [time.perf_counter() - start], items=hits, unit="hit")
+
+        for kind in ("count", "log"):
+            with g.ProbeSet(test) as probes:
+                if kind == "count":
+                    (probe,) = probes.count(g.locspec_function("printk"))
+                else:
+                    probe = probes.log(g.locspec_function("printk"), "%s", "fmt")
+                start = time.perf_counter()
+                g.cont_sync(test, timeout=args.timeout)
+                counted = probes.counts()[probe.location]
+                report(results, f"count by probe ({kind})", [time.perf_counter() - start], items=hits, unit="hit")
+                if counted != hits or (kind == "log" and len(probe.output) != hits):
+                    raise Exception(f"probe counted {counted} of {hits} hits, logged {len(probe.output)}")
+    finally:
+        session.exit()
+
+
+def bench_check_responses(args, results: dict) -> None:
+    stream = [{"type": "console", "message": None, "payload": f"line {i}\n", "token": None} for i in range(100)]
+    dicts = stream + [{"type": "result", "message": "done", "payload": None, "token": 1}]
+    for kind, responses in (("dicts", dicts), ("Response", g.Response(record(d) for d in dicts))):
+        hit, miss = [], []
+        for _ in range(args.stops):
+            start = time.perf_counter()
+            g.check_responses(responses, message="done")
+            hit.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            g.check_responses(responses, message="stopped")
+            miss.append(time.perf_counter() - start)
+        report(results, f"check_responses {kind} (hit)", hit)
+        report(results, f"check_responses {kind} (miss)", miss)
+
+
+BENCHMARKS = {
+    "console": bench_console,
+    "gdb": bench_gdb,
+    "probes": bench_probes,
+    "check_responses": bench_check_responses,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("only", nargs="*", help=f"benchmarks to run, of {', '.join(BENCHMARKS)} (default: all)")
+    parser.add_argument("--lines", type=int, default=100_000, help="lines of generated console log")
+    parser.add_argument("--marker-every", type=int, default=100, help="lines between two console waits")
+    parser.add_argument("--console-log", help="stream this recorded console.log instead of a generated one")
+    parser.add_argument("--rate", type=float, default=0.0, help="console bytes per second (0: unthrottled)")
+    parser.add_argument("--stops", type=int, default=2000, help="stop events / iterations per GDB benchmark")
+    parser.add_argument("--stream-lines", type=int, default=0, help="MI stream records per fake GDB response")
+    parser.add_argument("--notify", type=int, default=0, help="MI notify records per fake stop event")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+    for name in args.only:
+        if name not in BENCHMARKS:
+            parser.error(f"unknown benchmark {name!r}")
+
+    results: dict = {}
+    for name, bench in BENCHMARKS.items():
+        if not args.only or name in args.only:
+            bench(args, results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,14 @@ import re
 import subprocess
 import unittest
 
+from . import timing
+from .config import config
+
 
 def main() -> None:
     parser = argparse.ArgumentParser()
     parser.add_argument("--lab", help="lab to test")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="number of tests to run in parallel")
 
     args = parser.parse_args()
 
@@ -45,6 +49,19 @@ def main() -> None:
     except Exception as e:
         print(f"An error occurred while loading tests for lab{lab_num}: {e}")
 
+    if args.jobs > 1:
+        from .runner import run_parallel
+
+        run_parallel(suite, args.jobs)
+        report_timing()
+        return
+
     # runner = pycotap.TAPTestRunner(message_log=pycotap.LogMode.LogToError, test_output_log=pycotap.LogMode.LogToError)
     runner = unittest.TextTestRunner(verbosity=2)
     runner.run(suite)
+    report_timing()
+
+
+def report_timing() -> None:
+    timing.write_report(os.path.join(config.outputdir, "timing.json"))
+    timing.print_summary()
@@ -0,0 +1,267 @@
+"""
+Awaitable counterparts of the blocking GDB, console and QMP helpers.
+
+Every GDB session keeps its one reader thread, which hands records to the
+event loop with call_soon_threadsafe; waiting on them takes no further thread.
+Console sockets are watched with loop.add_reader, so they take no thread at
+all. QMP goes through the synchronous QEMUMachine API and runs in the default
+executor, serialised per VM by monitor.qmp_lock. Conditions can be awaited together, e.g.
+
+    await asyncio.wait_for(asyncio.gather(aio.cont_sync(self), aio.wait_for_console_pattern(self, "OpenSBI v")), 10)
+"""
+
+import asyncio
+import functools
+import weakref
+
+from . import timing
+from .config import config
+from .gdb.records import AsyncRecord, LogView, Record, Response
+from .qemu import monitor
+from .qemu.console import ConsoleMatcher, ConsoleTimeoutError, console_stream
+
+
+class GdbEvents:
+    """
+    Async records of a GDB session, delivered to waiters on one event loop.
+    """
+
+    def __init__(self, session, loop: asyncio.AbstractEventLoop):
+        self.session = session
+        self.loop = loop
+        # (predicate, future) of the pending waits
+        self.waiters: list[tuple[object, asyncio.Future]] = []
+        session.add_listener(self._on_event)
+
+    def _on_event(self, r: Record) -> bool:
+        # reader thread
+        if isinstance(r, AsyncRecord) and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self._deliver, r)
+        return False
+
+    def _deliver(self, r: AsyncRecord) -> None:
+        if not self.session.queued(r):
+            # taken off the session queue by a blocking wait (or a sync that found it there) before
+            # this callback ran, so it belongs to that wait and must not resolve a later one
+            return
+        for waiter in list(self.waiters):
+            predicate, future = waiter
+            if future.done():
+                self.waiters.remove(waiter)
+            elif predicate(r):
+                future.set_result(r)
+                self.waiters.remove(waiter)
+
+    def wait(self, predicate) -> asyncio.Future:
+        """
+        A future for the next record satisfying predicate. Create it before sending the
+        command that causes the record, so the record cannot slip past.
+        """
+        future = self.loop.create_future()
+        self.waiters.append((predicate, future))
+        return future
+
+    def close(self) -> None:
+        self.session.remove_listener(self._on_event)
+        if not self.loop.is_closed():
+            for _, future in self.waiters:
+                future.cancel()
+        self.waiters.clear()
+
+
+_gdb_events: weakref.WeakKeyDictionary[object, GdbEvents] = weakref.WeakKeyDictionary()
+
+
+def gdb_events(test) -> GdbEvents:
+    """
+    The GdbEvents of test.gdb for the running event loop, replacing one left over from another loop.
+    """
+    loop = asyncio.get_running_loop()
+    events = _gdb_events.get(test.gdb)
+    if events is None or events.loop is not loop:
+        if events is not None:
+            events.close()
+        events = GdbEvents(test.gdb, loop)
+        _gdb_events[test.gdb] = events
+    return events
+
+
+def close_gdb_events(test) -> None:
+    events = _gdb_events.pop(test.gdb, None)
+    if events is not None:
+        events.close()
+
+
+def _is_stopped(r: Record) -> bool:
+    return r.type == "notify" and r.message == "stopped"
+
+
+async def write(test, command: str, timeout: float = config.wait_timeout) -> Response:
+    """
+    Send an MI command and wait for its records, ending with its result record.
+    """
+    test.gdb_log.debug("GDB command: %s", command)
+    with timing.span(test, "gdb", command.split(" ", 1)[0], command):
+        try:
+            responses = await asyncio.wait_for(asyncio.wrap_future(test.gdb.submit(command)), timeout)
+        except TimeoutError:
+            raise TimeoutError(f"Timeout waiting for GDB to answer '{command}'") from None
+    test.gdb_log.debug("GDB response: %s", LogView(responses))
+    return responses
+
+
+def _take_event(test, event: AsyncRecord) -> Response:
+    # the event also went to the session queue, take it and what came before it off there
+    try:
+        return test.gdb.wait_event(lambda r: r is event, 0)
+    except TimeoutError:
+        return Response([event])
+
+
+async def sync(test, timeout: float = config.wait_timeout) -> Response:
+    """
+    Wait for the target to stop. Returns the queued events up to and including the *stopped record.
+    """
+    stopped = gdb_events(test).wait(_is_stopped)
+    try:
+        # it may have stopped already
+        responses = test.gdb.wait_event(_is_stopped, 0)
+        stopped.cancel()
+    except TimeoutError:
+        with timing.span(test, "gdb", "*stopped"):
+            try:
+                event = await asyncio.wait_for(stopped, timeout)
+            except TimeoutError:
+                raise TimeoutError("Timeout waiting for GDB to stop") from None
+        responses = _take_event(test, event)
+    test.gdb_log.debug("GDB response: %s", LogView(responses))
+    return responses
+
+
+async def cont_sync(test, timeout: float = config.wait_timeout) -> Response:
+    """
+    Continue the target and wait until it stops again.
+    """
+    stopped = gdb_events(test).wait(_is_stopped)
+    try:
+        responses = await write(test, "-exec-continue", timeout)
+        if responses.stopped_event is None:
+            with timing.span(test, "gdb", "*stopped"):
+                event = await asyncio.wait_for(stopped, timeout)
+            responses.extend(_take_event(test, event))
+    except TimeoutError:
+        raise TimeoutError("Timeout waiting for GDB to stop") from None
+    finally:
+        stopped.cancel()
+    test.gdb_log.debug("GDB response: %s", LogView(responses))
+    return responses
+
+
+async def wait_event(test, predicate, timeout: float = config.wait_timeout) -> AsyncRecord:
+    """
+    Wait for the next async record satisfying predicate, e.g. a =breakpoint-modified.
+    Only records arriving after the call count.
+    """
+    try:
+        return await asyncio.wait_for(gdb_events(test).wait(predicate), timeout)
+    except TimeoutError:
+        raise TimeoutError("Timeout waiting for GDB event") from None
+
+
+# console streams with an async wait in progress, which owns the socket's reader callback
+_console_busy: weakref.WeakSet = weakref.WeakSet()
+
+
+async def _console_wait_until_match(test, stream, matcher, timeout):
+    found = stream.search(matcher)
+    if found is None:
+        if stream in _console_busy:
+            raise RuntimeError("Another console wait is in progress on this VM, wait for all patterns at once")
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+
+        def readable():
+            if done.done():
+                return
+            while True:
+                received = stream.fill(0)
+                if received is None:
+                    break
+                if received == 0:
+                    if not done.done():
+                        done.set_result(None)
+                    return
+            m = stream.search(matcher)
+            if m is not None and not done.done():
+                done.set_result(m)
+
+        _console_busy.add(stream)
+        loop.add_reader(stream.fileno(), readable)
+        try:
+            found = await asyncio.wait_for(done, timeout)
+        except TimeoutError:
+            raise ConsoleTimeoutError(matcher.success, timeout, stream.tail()) from None
+        finally:
+            loop.remove_reader(stream.fileno())
+            _console_busy.discard(stream)
+        if found is None:
+            test.fail(f"EOF in console, expected {matcher.success}")
+    if found.failure:
+        stream.sock.close()
+        test.fail(f"'{found.pattern}' found in console, expected {matcher.success}")
+    return found
+
+
+async def wait_for_console_pattern(test, success_message, failure_message=None, vm=None, timeout=None):
+    """
+    Wait until success_message shows up on the console, like console.wait_for_console_pattern.
+    Only one console wait can be in progress per VM.
+    """
+    assert success_message
+    stream = console_stream(vm if vm is not None else test.vm)
+    matcher = ConsoleMatcher(success_message, failure_message)
+    with timing.span(test, "console", "wait", str(success_message)):
+        return await _console_wait_until_match(
+            test, stream, matcher, config.wait_timeout if timeout is None else timeout
+        )
+
+
+async def wait_for_console_patterns(test, success_messages, failure_message=None, vm=None, timeout=None):
+    """
+    Wait until every pattern in success_messages has shown up on the console, in any order.
+    """
+    assert success_messages
+    if timeout is None:
+        timeout = config.wait_timeout
+    stream = console_stream(vm if vm is not None else test.vm)
+    matcher = ConsoleMatcher(success_messages, failure_message)
+    matches = [None] * len(matcher.success)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    with timing.span(test, "console", "wait_all", str(success_messages)):
+        while None in matches:
+            try:
+                found = await _console_wait_until_match(test, stream, matcher, max(0.0, deadline - loop.time()))
+            except ConsoleTimeoutError:
+                missing = [p for p, m in zip(matcher.success, matches, strict=True) if m is None]
+                raise ConsoleTimeoutError(missing, timeout, stream.tail()) from None
+            if matches[found.index] is None:
+                matches[found.index] = found
+    return matches
+
+
+async def qmp(test, command: str, arguments: dict = None):
+    """
+    Run a QMP command, as monitor.execute does.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, monitor.execute, test, command, arguments)
+
+
+async def qmp_event(test, name: str, timeout: float = config.wait_timeout, match: dict = None, vm=None):
+    """
+    Wait for the QMP event name, e.g. "RESET" or "SHUTDOWN". Returns it, or None on timeout.
+    """
+    vm = vm if vm is not None else test.vm
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(monitor.event_wait, vm, name, timeout, match))
@@ -0,0 +1,64 @@
+"""
+On-disk cache for metadata that is expensive to query, shared by all runs on a host.
+Entries are JSON files named after a hash of their key.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from .config import config
+
+
+def _path(namespace: str, key) -> str:
+    digest = hashlib.sha256(json.dumps(key).encode()).hexdigest()
+    return os.path.join(config.cache_dir, namespace, f"{digest}.json")
+
+
+def load(namespace: str, key):
+    """
+    Return the value stored under key, or None if there is none.
+    """
+    if not config.cache_dir:
+        return None
+    try:
+        with open(_path(namespace, key)) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # guard against hash collisions and entries written by another layout
+    if entry.get("key") != json.loads(json.dumps(key)):
+        return None
+    return entry.get("value")
+
+
+def store(namespace: str, key, value) -> None:
+    """
+    Store value under key. Concurrent writers are fine: the file is replaced atomically.
+    """
+    if not config.cache_dir:
+        return
+    path = _path(namespace, key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"key": key, "value": value}, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass
+
+
+def file_key(path: str) -> str | None:
+    """
+    Identify a file by its resolved path, size and modification time.
+    Bare command names are looked up in PATH.
+    """
+    resolved = shutil.which(path) if os.path.basename(path) == path else path
+    try:
+        st = os.stat(resolved)
+    except (OSError, TypeError):
+        return None
+    return f"{os.path.realpath(resolved)}:{st.st_size}:{st.st_mtime_ns}"
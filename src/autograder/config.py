@@ -8,10 +8,39 @@ class TestConfig:
     vmlinux_path: str = os.path.join(os.getcwd(), "kernel/vmlinux")
     image_path: str = os.path.join(os.getcwd(), "rootfs.ext2")
     outputdir: str = os.path.join(os.getcwd(), "test")
+    # give every test its own directory under outputdir (set for parallel runs)
+    per_test_outputdir: bool = False
+    # shared across runs; empty to disable on-disk caching
+    cache_dir: str = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "autograder")
     frequency: float = 0.1
     wait_timeout: float = 30.0
+    console_chunk_size: int = 64 * 1024
+    console_window: int = 64 * 1024
+    # record every console line to console.jsonl in the output directory, the latest in memory as well
+    console_record: bool = True
+    console_record_window: int = 1024 * 1024
+    gdb_event_backlog: int = 10000
+    # console output after which the guest will not get anywhere; waiting for GDB fails as soon as it shows up
+    console_failure_patterns: list[str] = field(default_factory=lambda: ["Kernel panic"])
+    # QMP events that end a wait for GDB the same way
+    failure_events: list[str] = field(default_factory=lambda: ["GUEST_PANICKED", "SHUTDOWN"])
+    # MI lines longer than this are cut short in gdb.log
+    gdb_log_max: int = 4096
+    # guest memory reads up to this size go over GDB, larger ones through a QEMU dump mapped from memory_dump_dir
+    memory_gdb_max: int = 4096
+    memory_dump_dir: str = "/dev/shm"
+    # let GDB keep the symbol index of vmlinux in cache_dir, keyed by build-id
+    gdb_index_cache: bool = True
+    # TCP port of the QEMU gdbstub, or "auto" for a private UNIX socket per test
     qemu_gdbstub_port: str = "1234"
     qemu_bin: str = "qemu-system-riscv64"
+    # start tests from a saved machine state stopped at the kernel entry instead of booting
+    boot_snapshot: bool = False
+    # keep this many launched QEMU and symbol-loaded GDB processes ready; 0 disables the pool
+    # (takes precedence over boot_snapshot)
+    pool_size: int = 0
+    # recycle pooled processes at most this many times before replacing them
+    pool_max_reuse: int = 8
     qemu_args: list[str] = field(
         default_factory=lambda: [
             "-kernel",
@@ -26,7 +55,6 @@ class TestConfig:
             "virtio-net-device,netdev=net0",
             "-append",
             "root=/dev/vda ro console=ttyS0",
-            "-s",
             "-S",
         ]
     )
@@ -3,6 +3,7 @@ Utility functions for interacting with GDB via MI (Machine Interface).
 See https://sourceware.org/gdb/current/onlinedocs/gdb#GDB_002fMI
 """
 
+from .bpset import Breakpoint, BreakpointSet
 from .breakpoint import (
     break_after,
     break_commands,
@@ -12,6 +13,7 @@ from .breakpoint import (
     break_enable,
     break_info,
     break_insert,
+    break_insert_command,
     break_list,
 )
 from .data import (
@@ -38,11 +40,14 @@ from .exec import (
 from .file import file_exec_and_symbols
 from .gdb import (
     info_register,
+    registers,
     sync,
     cont_sync,
     cont,
 )
-from .locspec import locspec_address, locspec_function, locspec_line
+from .locspec import locspec_address, locspec_function, locspec_line, locspec_symbol
+from .probe import Probe, ProbeSet
+from .records import Record, Response
 from .stack import (
     stack_list_frames,
 )
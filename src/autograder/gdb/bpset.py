@@ -0,0 +1,129 @@
+"""
+Breakpoint Sets
+
+A group of breakpoints inserted together and watched as the target runs.
+"""
+
+from dataclasses import dataclass
+
+from ..config import config
+from .breakpoint import break_delete, break_insert_command
+from .gdb import cont_sync
+from .records import AsyncRecord, Record
+from .utils import write_many
+
+
+@dataclass
+class Breakpoint:
+    number: str
+    location: str
+    temporary: bool = False
+    # stops at this breakpoint since it was inserted
+    hits: int = 0
+    deleted: bool = False
+
+
+class BreakpointSet:
+    """
+    Breakpoints inserted with one pipelined batch of -break-insert commands.
+
+    Hits are counted from the *stopped records GDB reports, whichever call
+    consumed them, so the counts stay right across cont_sync, sync and run_until.
+    """
+
+    def __init__(self, test):
+        self.test = test
+        self.session = test.gdb
+        self.by_number: dict[str, Breakpoint] = {}
+        self.last_hit: Breakpoint | None = None
+        self.session.add_listener(self._on_event)
+
+    def __enter__(self) -> "BreakpointSet":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        try:
+            self.clear()
+        finally:
+            self.close()
+
+    def __iter__(self):
+        return iter(self.by_number.values())
+
+    def _on_event(self, r: Record) -> None:
+        if not isinstance(r, AsyncRecord) or r.message != "stopped" or r.reason != "breakpoint-hit":
+            return
+        bp = self.by_number.get(r.payload.get("bkptno"))
+        if bp is None:
+            return
+        bp.hits += 1
+        if r.payload.get("disp") == "del":
+            bp.deleted = True
+        self.last_hit = bp
+
+    def insert(self, *locations: str, temporary: bool = False, **options) -> list[Breakpoint]:
+        """
+        Insert a breakpoint at each location spec, taking options of break_insert.
+        """
+        commands = [break_insert_command(loc, temporary=temporary, **options) for loc in locations]
+        inserted = []
+        for location, response in zip(locations, write_many(self.test, commands), strict=True):
+            number = response.bkpt_number
+            if number is None:
+                result = response.result
+                raise Exception(f"Failed to insert breakpoint at {location}: {result and result.error}")
+            bp = Breakpoint(number, location, temporary)
+            self.by_number[number] = bp
+            inserted.append(bp)
+        return inserted
+
+    def find(self, location: str) -> Breakpoint | None:
+        for bp in self.by_number.values():
+            if bp.location == location and not bp.deleted:
+                return bp
+        return None
+
+    def _resolve(self, bp: Breakpoint | int | str) -> Breakpoint:
+        if isinstance(bp, Breakpoint):
+            return bp
+        found = self.by_number.get(str(bp)) or self.find(str(bp))
+        if found is None:
+            raise KeyError(f"No breakpoint {bp} in this set")
+        return found
+
+    def run_until(self, any_of=None, timeout: float = config.wait_timeout) -> Breakpoint | None:
+        """
+        Continue until one of the breakpoints in any_of (all of this set by default) is hit,
+        continuing through other breakpoints of the set. Breakpoints may be given as Breakpoint
+        objects, numbers or location specs. Returns the breakpoint hit, or None if the target
+        stopped for another reason, e.g. a breakpoint outside the set or a signal.
+        """
+        wanted = {b.number for b in map(self._resolve, any_of)} if any_of is not None else None
+        while True:
+            stopped = cont_sync(self.test, timeout).stopped_event
+            if stopped is None or stopped.reason != "breakpoint-hit":
+                return None
+            bp = self.by_number.get(stopped.payload.get("bkptno"))
+            if bp is None:
+                return None
+            if wanted is None or bp.number in wanted:
+                return bp
+
+    def delete(self, *bps) -> None:
+        remaining = [bp for bp in map(self._resolve, bps) if not bp.deleted]
+        if remaining:
+            break_delete(self.test, *(bp.number for bp in remaining))
+        for bp in remaining:
+            bp.deleted = True
+
+    def clear(self) -> None:
+        """
+        Delete every breakpoint of the set still in GDB.
+        """
+        self.delete(*self.by_number.values())
+
+    def close(self) -> None:
+        """
+        Stop tracking hits. The breakpoints themselves stay in GDB.
+        """
+        self.session.remove_listener(self._on_event)
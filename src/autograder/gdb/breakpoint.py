@@ -2,17 +2,18 @@
 GDB/MI Breakpoint Commands
 """
 
+from .records import Response
 from .utils import write
 
 
-def break_after(test, number: int, count: int) -> list[dict]:
+def break_after(test, number: int, count: int) -> Response:
     """
     The corresponding GDB command is ‘ignore’.
     """
     return write(test, f"-break-after {number} {count}")
 
 
-def break_commands(test, number: int, *commands: str) -> list[dict]:
+def break_commands(test, number: int, *commands: str) -> Response:
     """
     The corresponding GDB command is ‘commands’.
     """
@@ -20,7 +21,7 @@ def break_commands(test, number: int, *commands: str) -> list[dict]:
     return write(test, f"-break-commands {number} {cmd_str}".strip())
 
 
-def break_condition(test, number: int, expr: str = "", force: bool = False) -> list[dict]:
+def break_condition(test, number: int, expr: str = "", force: bool = False) -> Response:
     """
     The corresponding GDB command is ‘condition’.
     """
@@ -31,7 +32,7 @@ def break_condition(test, number: int, expr: str = "", force: bool = False) -> l
         return write(test, f"-break-condition {force_flag}{number}")
 
 
-def break_delete(test, *numbers: int) -> list[dict]:
+def break_delete(test, *numbers: int) -> Response:
     """
     The corresponding GDB command is ‘delete’.
     """
@@ -39,7 +40,7 @@ def break_delete(test, *numbers: int) -> list[dict]:
     return write(test, f"-break-delete {nums}")
 
 
-def break_disable(test, *numbers: int) -> list[dict]:
+def break_disable(test, *numbers: int) -> Response:
     """
     The corresponding GDB command is ‘disable’.
     """
@@ -47,7 +48,7 @@ def break_disable(test, *numbers: int) -> list[dict]:
     return write(test, f"-break-disable {nums}")
 
 
-def break_enable(test, *numbers: int) -> list[dict]:
+def break_enable(test, *numbers: int) -> Response:
     """
     The corresponding GDB command is ‘enable’.
     """
@@ -55,7 +56,7 @@ def break_enable(test, *numbers: int) -> list[dict]:
     return write(test, f"-break-enable {nums}")
 
 
-def break_info(test, number: int) -> list[dict]:
+def break_info(test, number: int) -> Response:
     """
     The corresponding GDB command is ‘info break breakpoint’.
     """
@@ -77,10 +78,46 @@ def break_insert(
     thread_id: int | None = None,
     thread_group_id: str = "",
     ignore_error: bool = True,
-) -> list[dict]:
+) -> Response:
     """
     The corresponding GDB commands are ‘break’, ‘tbreak’, ‘hbreak’, and ‘thbreak’.
     """
+    return write(
+        test,
+        break_insert_command(
+            locspec,
+            temporary,
+            hardware,
+            pending,
+            disabled,
+            tracepoint,
+            qualified,
+            condition,
+            force_condition,
+            ignore_count,
+            thread_id,
+            thread_group_id,
+        ),
+    )
+
+
+def break_insert_command(
+    locspec: str,
+    temporary: bool = False,
+    hardware: bool = False,
+    pending: bool = False,
+    disabled: bool = False,
+    tracepoint: bool = False,
+    qualified: bool = False,
+    condition: str = "",
+    force_condition: bool = False,
+    ignore_count: int | None = None,
+    thread_id: int | None = None,
+    thread_group_id: str = "",
+) -> str:
+    """
+    The -break-insert command break_insert sends, for pipelining several with write_many.
+    """
     args = []
     if temporary:
         args.append("-t")
@@ -107,10 +144,10 @@ def break_insert(
     if locspec:
         args.append(locspec)
     cmd = " ".join(str(a) for a in args)
-    return write(test, f"-break-insert {cmd}".strip())
+    return f"-break-insert {cmd}".strip()
 
 
-def break_list(test) -> list[dict]:
+def break_list(test) -> Response:
     """
     The corresponding GDB command is ‘info breakpoints’.
     """
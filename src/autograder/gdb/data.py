@@ -2,39 +2,44 @@
 GDB/MI Data Manipulation
 """
 
+from .records import Response
 from .utils import write
 
 
-def data_disassemble(test, start_addr: str, end_addr: str = "", mode: str = "0") -> list[dict]:
+def data_disassemble(test, start_addr: str, end_addr: str = "", mode: str = "0") -> Response:
     """
     The corresponding GDB command is ‘disassemble’.
     """
     if end_addr:
-        return write(f"-data-disassemble -s {start_addr} -e {end_addr} -- {mode}")
+        return write(test, f"-data-disassemble -s {start_addr} -e {end_addr} -- {mode}")
     else:
         return write(test, f"-data-disassemble -s {start_addr} -- {mode}")
 
 
-def data_evaluate_expression(test, expr: str) -> list[dict]:
+def data_evaluate_expression(test, expr: str) -> Response:
     """
     The corresponding GDB command is ‘print’, ‘output’, and ‘call’.
     """
     return write(test, f"-data-evaluate-expression {expr}")
 
 
-def data_list_changed_registers(test) -> list[dict]:
+def data_list_changed_registers(test) -> Response:
     return write(test, "-data-list-changed-registers")
 
 
-def data_list_register_names(test) -> list[dict]:
+def data_list_register_names(test) -> Response:
     return write(test, "-data-list-register-names")
 
 
-def data_list_register_values(test, fmt: str = "x", regno: int = -1) -> list[dict]:
+def data_list_register_values(test, fmt: str = "x", regno: int | list[int] = -1) -> Response:
     """
     The corresponding GDB command is ‘info reg’.
+    regno may be a list to read several registers at once.
     """
-    if regno >= 0:
+    if isinstance(regno, list):
+        nums = " ".join(str(n) for n in regno)
+        return write(test, f"-data-list-register-values {fmt} {nums}")
+    elif regno >= 0:
         return write(test, f"-data-list-register-values {fmt} {regno}")
     else:
         return write(test, f"-data-list-register-values {fmt}")
@@ -48,11 +53,12 @@ def data_read_memory(
     nr_rows: int = 1,
     nr_cols: int = 16,
     ignore_error: bool = True,
-) -> list[dict]:
+) -> Response:
     """
     The corresponding GDB command is ‘x’.
     """
     return write(
+        test,
         f"-data-read-memory 0x{address:x} {word_format} {word_size} {nr_rows} {nr_cols}",
         raise_error_on_timeout=not ignore_error,
     )
@@ -64,7 +70,7 @@ def data_read_memory_bytes(
     count: int,
     offset: int = 0,
     ignore_error: bool = True,
-) -> list[dict]:
+) -> Response:
     """
     The corresponding GDB command is ‘x’.
     """
@@ -2,10 +2,11 @@
 GDB/MI File Commands
 """
 
+from .records import Response
 from .utils import write
 
 
-def file_exec_and_symbols(test, file: str = "") -> list[dict]:
+def file_exec_and_symbols(test, file: str = "") -> Response:
     """
     The corresponding GDB command is ‘file’.
     """
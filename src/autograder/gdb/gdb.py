@@ -2,74 +2,103 @@
 GDB/MI Functions Packed as GDB command
 """
 
-import time
-
+from .. import cache, timing, wait
 from ..config import config
 from .data import data_list_register_names, data_list_register_values
 from .exec import exec_continue
-from .utils import check_responses
+from .records import LogView, Response
+
+
+def _register_numbers(test) -> dict[str, int]:
+    session = test.gdb
+    if session.register_numbers is None:
+        numbers = None
+        if session.cache_key is not None:
+            numbers = cache.load("register-numbers", session.cache_key)
+        if numbers is None:
+            numbers = {}
+            response = data_list_register_names(test)
+            if response.has("result", "done"):
+                for idx, name in enumerate(response.payload.get("register-names", [])):
+                    if name:
+                        numbers[name] = idx
+            if numbers and session.cache_key is not None:
+                cache.store("register-numbers", session.cache_key, numbers)
+        session.register_numbers = numbers
+    return session.register_numbers
+
+
+def registers(test, names: list[str]) -> dict[str, int | str]:
+    """
+    Read the registers in names with a single MI command.
+    Values are ints; registers that are not plain integers (e.g. vectors) keep GDB's string.
+    Unknown registers are left out. The values are cached until the target runs again.
+    """
+    session = test.gdb
+    while True:
+        generation = session.generation
+        cache = session.register_cache
+        missing = [n for n in names if n not in cache]
+        if missing:
+            numbers = _register_numbers(test)
+            regnos = {numbers[n]: n for n in missing if n in numbers}
+            if regnos:
+                response = data_list_register_values(test, "x", list(regnos))
+                if response.has("result", "done"):
+                    for v in response.payload.get("register-values", []):
+                        name = regnos.get(int(v.get("number", -1)))
+                        if name is not None:
+                            cache[name] = _register_value(v.get("value"))
+        # retry if the target ran or stopped while we were reading
+        if session.generation == generation:
+            return {n: cache[n] for n in names if n in cache}
 
-_register_name_to_number = None
+
+def _register_value(val_str: str) -> int | str:
+    try:
+        return int(val_str, 16)
+    except (TypeError, ValueError):
+        return val_str
 
 
 def info_register(test, regname: str, fmt: str = "x") -> str:
     """
     Query GDB for the value of the register named regname in the given format.
-    Uses data_list_register_names and data_list_register_values.
-    Returns the register value as int, or None if not found.
+    Returns the register value as a string, or None if not found.
     """
-    global _register_name_to_number
-    if _register_name_to_number is None:
-        _register_name_to_number = {}
-        response = data_list_register_names(test)
-        for r in response:
-            if r.get("type") == "result" and r.get("message") == "done":
-                names = r.get("payload", {}).get("register-names", [])
-                for idx, name in enumerate(names):
-                    if name:
-                        _register_name_to_number[name] = idx
-    regno = _register_name_to_number.get(regname)
+    if fmt == "x":
+        value = registers(test, [regname]).get(regname)
+        return hex(value) if isinstance(value, int) else value
+    regno = _register_numbers(test).get(regname)
     if regno is None:
         return None
     response = data_list_register_values(test, fmt, regno)
-    for r in response:
-        if r.get("type") == "result" and r.get("message") == "done":
-            values = r.get("payload", {}).get("register-values", [])
-            for v in values:
-                if int(v.get("number", -1)) == regno:
-                    val_str = v.get("value")
-                    try:
-                        return val_str
-                    except Exception:
-                        return None
+    if response.has("result", "done"):
+        for v in response.payload.get("register-values", []):
+            if int(v.get("number", -1)) == regno:
+                return v.get("value")
     return None
 
 
-def cont(test) -> list[dict]:
+def cont(test) -> Response:
     return exec_continue(test)
 
 
-def sync(test, timeout: float = config.wait_timeout) -> list[dict]:
-    # loop and accumulate responses until we see a "stopped" event or timeout
-    deadline = time.time() + timeout
-    responses = []
-    while time.time() < deadline:
-        resp = test.gdb.get_gdb_response(timeout_sec=config.frequency, raise_error_on_timeout=False)
-        if resp:
-            responses.extend(resp)
-            for r in resp:
-                test.gdb_log.debug("GDB response: %s", r)
-            for r in resp:
-                if r["message"] == "stopped":
-                    return responses
+def sync(test, timeout: float = config.wait_timeout) -> Response:
+    # accumulate responses until we see a "stopped" event or timeout
+    with timing.span(test, "gdb", "*stopped"):
+        if getattr(test, "vm", None) is not None:
+            # also watch the console and QEMU, so a panicking kernel fails now rather than at the timeout
+            responses = wait.wait_stopped(test, timeout)
         else:
-            test.gdb_log.debug("GDB sync: no response, still waiting...")
-            time.sleep(config.frequency)
-    raise TimeoutError("Timeout waiting for GDB to stop")
+            responses = test.gdb.wait_stopped(timeout)
+    test.gdb_log.debug("GDB response: %s", LogView(responses))
+    return responses
 
 
-def cont_sync(test, timeout: float = config.wait_timeout) -> None:
+def cont_sync(test, timeout: float = config.wait_timeout) -> Response:
     responses = exec_continue(test)
-    if check_responses(responses, message="stopped"):
+    if responses.stopped_event is not None:
         return responses
     responses.extend(sync(test, timeout=timeout))
+    return responses
@@ -2,6 +2,8 @@
 Location Specifications
 """
 
+from .. import symbols
+
 
 def locspec_line(line: int) -> str:
     """Location spec for a line number in the current source file."""
@@ -40,6 +42,14 @@ def locspec_address(address: int | str) -> str:
     return f"*{address}"
 
 
+def locspec_symbol(symbol: str) -> str:
+    """
+    Location spec for the address of a kernel symbol, resolved with the local ELF symbol index
+    instead of by GDB. Unlike locspec_function this stops at the first instruction, before the prologue.
+    """
+    return locspec_address(symbols.address(symbol))
+
+
 def locspec_explicit(
     source: str = "",
     function: str = "",
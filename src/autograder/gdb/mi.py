@@ -0,0 +1,171 @@
+"""
+GDB/MI Output Parser
+
+A single-pass parser for MI output lines, producing the same structure as
+pygdbmi: tuples become dicts, lists of values or of results become lists, and
+a name repeated within a tuple collects its values into a list. Stream records
+(~, @, &) are the bulk of GDB's chatter and rarely read, so their C strings are
+only unescaped when the payload is first accessed.
+See https://sourceware.org/gdb/current/onlinedocs/gdb#GDB_002fMI-Output-Syntax
+"""
+
+import re
+
+from .records import AsyncRecord, Record, ResultRecord, StreamRecord
+
+_PREFIX = re.compile(r"(\d*)([\^*+=~@&])")
+_CLASS = re.compile(r"[\w-]+")
+_NAME = re.compile(r"([\w.-]+)=")
+_STRING = re.compile(r'"([^"\\]*(?:\\.[^"\\]*)*)"')
+_ESCAPE = re.compile(rb"\\(?:([0-7]{1,3})|(.))", re.DOTALL)
+_ESCAPES = {
+    b"n": b"\n",
+    b"t": b"\t",
+    b"r": b"\r",
+    b"a": b"\a",
+    b"b": b"\b",
+    b"f": b"\f",
+    b"v": b"\v",
+    b"e": b"\x1b",
+    b'"': b'"',
+    b"\\": b"\\",
+}
+_STREAMS = {"~": "console", "@": "target", "&": "log"}
+
+
+def unescape(s: str) -> str:
+    """
+    Decode the body of an MI C string. Octal escapes are bytes of UTF-8 text.
+    """
+    if "\\" not in s:
+        return s
+
+    def replace(m: re.Match) -> bytes:
+        if m.group(1):
+            return bytes([int(m.group(1), 8) & 0xFF])
+        return _ESCAPES.get(m.group(2), m.group(2))
+
+    return _ESCAPE.sub(replace, s.encode()).decode(errors="replace")
+
+
+class LazyStreamRecord(StreamRecord):
+    """
+    A stream record that keeps its C string escaped until the payload is read.
+    """
+
+    __slots__ = ("_raw",)
+
+    def __init__(self, type: str, raw: str, line: str):
+        super().__init__(type, None, None, None, line)
+        self._raw = raw
+
+    @property
+    def payload(self) -> str:
+        if self._raw is not None:
+            self._payload = unescape(self._raw)
+            self._raw = None
+        return self._payload
+
+
+class _Parser:
+    __slots__ = ("s", "pos")
+
+    def __init__(self, s: str, pos: int):
+        self.s = s
+        self.pos = pos
+
+    def error(self, what: str) -> ValueError:
+        return ValueError(f"Malformed MI output, expected {what} at column {self.pos}: {self.s!r}")
+
+    def expect(self, c: str) -> None:
+        if self.s.startswith(c, self.pos):
+            self.pos += 1
+        else:
+            raise self.error(repr(c))
+
+    def results(self, end: str | None) -> dict:
+        out = {}
+        repeated = set()
+        while True:
+            m = _NAME.match(self.s, self.pos)
+            if m is None:
+                raise self.error("a result")
+            self.pos = m.end()
+            name, value = m.group(1), self.value()
+            if name not in out:
+                out[name] = value
+            elif name in repeated:
+                out[name].append(value)
+            else:
+                out[name] = [out[name], value]
+                repeated.add(name)
+            if self.s.startswith(",", self.pos):
+                self.pos += 1
+                continue
+            if end is not None:
+                self.expect(end)
+            return out
+
+    def value(self):
+        s, pos = self.s, self.pos
+        c = s[pos : pos + 1]
+        if c == '"':
+            m = _STRING.match(s, pos)
+            if m is None:
+                raise self.error("a closing quote")
+            self.pos = m.end()
+            return unescape(m.group(1))
+        if c == "{":
+            if s.startswith("}", pos + 1):
+                self.pos = pos + 2
+                return {}
+            self.pos = pos + 1
+            return self.results("}")
+        if c == "[":
+            self.pos = pos + 1
+            items = []
+            if s.startswith("]", self.pos):
+                self.pos += 1
+                return items
+            while True:
+                # lists of results keep only the values, as pygdbmi does
+                m = _NAME.match(s, self.pos)
+                if m is not None:
+                    self.pos = m.end()
+                items.append(self.value())
+                if s.startswith(",", self.pos):
+                    self.pos += 1
+                    continue
+                self.expect("]")
+                return items
+        raise self.error("a value")
+
+
+def parse_line(line: str) -> Record:
+    """
+    Parse one line of MI output. Lines that are not MI records come back with type "output".
+    """
+    m = _PREFIX.match(line)
+    if m is None:
+        return Record("output", None, line, None, line)
+    token = int(m.group(1)) if m.group(1) else None
+    kind = m.group(2)
+    pos = m.end()
+    if kind in _STREAMS:
+        if not (line.startswith('"', pos) and line.endswith('"')):
+            return Record("output", None, line, None, line)
+        return LazyStreamRecord(_STREAMS[kind], line[pos + 1 : -1], line)
+    c = _CLASS.match(line, pos)
+    if c is None:
+        return Record("output", None, line, None, line)
+    payload = None
+    if line.startswith(",", c.end()):
+        try:
+            payload = _Parser(line, c.end() + 1).results(None)
+        except ValueError:
+            # keep the reader alive, the raw line is still there for the log
+            return Record("output", None, line, None, line)
+    if kind == "^":
+        return ResultRecord("result", c.group(), payload, token, line)
+    # exec (*), status (+) and notify (=) records all share the type "notify", as * and = do in pygdbmi
+    return AsyncRecord("notify", c.group(), payload, token, line)
@@ -0,0 +1,145 @@
+"""
+Counter Probes
+
+Breakpoints whose commands make GDB resume the target by itself ("silent",
+optionally a printf, then "continue"), so counting how often a function runs
+does not cost a round-trip to Python per hit. The stops and resumptions they
+cause are consumed by the probe set and never reach sync or cont_sync; GDB
+keeps the hit counts, which are read back with a single -break-list.
+"""
+
+from dataclasses import dataclass, field
+
+from .breakpoint import break_delete, break_insert_command, break_list
+from .records import AsyncRecord, Record
+from .utils import write_many
+
+# prefix of the console lines printed by logging probes, followed by the probe number
+_MARK = "@probe "
+
+
+def _c_string(s: str) -> str:
+    return '"' + s.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+@dataclass
+class Probe:
+    number: str
+    location: str
+    # hits since the probe was inserted, as of the last event seen or the last counts()
+    hits: int = 0
+    # lines printed by a logging probe
+    output: list[str] = field(default_factory=list)
+
+
+class ProbeSet:
+    """
+    Probes inserted together. Only use while the target is stopped, except for
+    the counting itself, and delete the probes (close or leave the with block)
+    before relying on plain breakpoints again.
+    """
+
+    def __init__(self, test):
+        self.test = test
+        self.session = test.gdb
+        self.by_number: dict[str, Probe] = {}
+        # a probe stop was consumed, so the *running of its continue is ours too
+        self._resuming = False
+        self.session.add_listener(self._on_event)
+
+    def __enter__(self) -> "ProbeSet":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def __iter__(self):
+        return iter(self.by_number.values())
+
+    def _on_event(self, r: Record) -> bool:
+        if isinstance(r, AsyncRecord):
+            payload = r.payload or {}
+            if r.message == "stopped":
+                probe = self.by_number.get(payload.get("bkptno")) if r.reason == "breakpoint-hit" else None
+                if probe is None:
+                    return False
+                probe.hits += 1
+                self._resuming = True
+                return True
+            if r.message == "running" and self._resuming:
+                self._resuming = False
+                return True
+            if r.message == "breakpoint-modified":
+                return payload.get("bkpt", {}).get("number") in self.by_number
+            return False
+        if r.type == "console" and r.payload.startswith(_MARK):
+            number, _, text = r.payload[len(_MARK) :].partition(": ")
+            probe = self.by_number.get(number)
+            if probe is None:
+                return False
+            probe.output.append(text.rstrip("\n"))
+            return True
+        return False
+
+    def _insert(self, locations: list[str], printf: tuple[str, tuple[str, ...]] | None, **options) -> list[Probe]:
+        inserted = []
+        for location, response in zip(
+            locations, write_many(self.test, [break_insert_command(loc, **options) for loc in locations]), strict=True
+        ):
+            number = response.bkpt_number
+            if number is None:
+                result = response.result
+                raise Exception(f"Failed to insert probe at {location}: {result and result.error}")
+            inserted.append(Probe(number, location))
+        # the commands need the numbers, so they go out as a second batch
+        batch = []
+        for probe in inserted:
+            lines = ["silent", "continue"]
+            if printf is not None:
+                format, args = printf
+                lines.insert(1, "printf " + ", ".join([_c_string(f"{_MARK}{probe.number}: {format}\\n"), *args]))
+            batch.append(f"-break-commands {probe.number} " + " ".join(_c_string(line) for line in lines))
+        for probe, response in zip(inserted, write_many(self.test, batch), strict=True):
+            if not response.has("result", "done"):
+                result = response.result
+                break_delete(self.test, *(p.number for p in inserted))
+                raise Exception(f"Failed to set commands of probe at {probe.location}: {result and result.error}")
+        for probe in inserted:
+            self.by_number[probe.number] = probe
+        return inserted
+
+    def count(self, *locations: str, **options) -> list[Probe]:
+        """
+        Insert a probe counting the hits at each location spec, taking options of break_insert,
+        e.g. condition to count only some of them.
+        """
+        return self._insert(list(locations), None, **options)
+
+    def log(self, location: str, format: str, *args: str, **options) -> Probe:
+        """
+        Insert a probe that also records printf(format, *args) on each hit, e.g.
+        log("printk", "%s", "fmt"). The lines end up in the output of the probe.
+        """
+        (probe,) = self._insert([location], (format, args), **options)
+        return probe
+
+    def counts(self) -> dict[str, int]:
+        """
+        Hits of every probe by location, read from GDB's hit counts with one -break-list.
+        """
+        response = break_list(self.test)
+        body = response.payload.get("BreakpointTable", {}).get("body", [])
+        times = {b.get("number"): int(b.get("times", 0)) for b in body if isinstance(b, dict)}
+        for probe in self:
+            probe.hits = times.get(probe.number, probe.hits)
+        return {probe.location: probe.hits for probe in self}
+
+    def close(self) -> None:
+        """
+        Delete the probes from GDB and stop consuming their events.
+        """
+        try:
+            if self.by_number:
+                break_delete(self.test, *self.by_number)
+        finally:
+            self.session.remove_listener(self._on_event)
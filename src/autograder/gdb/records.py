@@ -0,0 +1,241 @@
+"""
+GDB/MI Records
+
+Parsed MI output as slotted objects. Records still answer r["type"] and
+r.get("payload") like the dicts pygdbmi returns, so older callers keep working.
+"""
+
+from collections.abc import Sequence
+
+from ..config import config
+
+_FIELDS = ("type", "message", "payload", "token")
+
+
+class Record:
+    __slots__ = ("type", "message", "_payload", "token", "line", "seq")
+
+    def __init__(
+        self, type: str, message: str | None = None, payload=None, token: int | None = None, line: str | None = None
+    ):
+        self.type = type
+        self.message = message
+        self._payload = payload
+        self.token = token
+        # the MI line the record was parsed from
+        self.line = line
+        # order of arrival, stamped by the session on records that are not results
+        self.seq = 0
+
+    @property
+    def payload(self):
+        return self._payload
+
+    def get(self, key: str, default=None):
+        if key in _FIELDS:
+            value = getattr(self, key)
+            # unlike a dict, a missing payload falls back to the default, so r.get("payload", {}) is safe
+            return default if value is None and key == "payload" else value
+        return default
+
+    def __getitem__(self, key: str):
+        if key not in _FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Record):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def to_dict(self) -> dict:
+        return {"type": self.type, "message": self.message, "payload": self.payload, "token": self.token}
+
+    def __repr__(self) -> str:
+        return repr(self.to_dict())
+
+
+class ResultRecord(Record):
+    """
+    ^done, ^running, ^connected, ^error or ^exit, answering the command with the same token.
+    """
+
+    __slots__ = ()
+
+    @property
+    def error(self) -> str | None:
+        if self.message != "error":
+            return None
+        return (self.payload or {}).get("msg", "")
+
+
+class AsyncRecord(Record):
+    """
+    *exec and =notify records. pygdbmi files both under the type "notify".
+    """
+
+    __slots__ = ()
+
+    @property
+    def reason(self) -> str | None:
+        return (self.payload or {}).get("reason")
+
+    def hit(self, bkpt_number: str | int) -> bool:
+        """
+        Whether this is a stop at breakpoint bkpt_number.
+        """
+        payload = self.payload or {}
+        return (
+            self.message == "stopped"
+            and payload.get("reason") == "breakpoint-hit"
+            and payload.get("bkptno") == str(bkpt_number)
+        )
+
+
+class StreamRecord(Record):
+    """
+    Console (~), target (@) and log (&) output.
+    """
+
+    __slots__ = ()
+
+
+_CLASSES = {
+    "result": ResultRecord,
+    "notify": AsyncRecord,
+    "console": StreamRecord,
+    "target": StreamRecord,
+    "log": StreamRecord,
+}
+
+
+def record(parsed: dict) -> Record:
+    """
+    Turn a record parsed by pygdbmi into a Record of the matching class.
+    """
+    cls = _CLASSES.get(parsed["type"], Record)
+    return cls(parsed["type"], parsed.get("message"), parsed.get("payload"), parsed.get("token"))
+
+
+class LogView:
+    """
+    Records as they appear in the debug log: their MI lines, each capped at config.gdb_log_max characters.
+    Nothing is rendered unless a handler actually formats the log message.
+    """
+
+    __slots__ = ("records",)
+
+    def __init__(self, records):
+        self.records = records
+
+    def __str__(self) -> str:
+        lines = []
+        for r in self.records:
+            line = r.line if isinstance(r, Record) and r.line is not None else repr(r)
+            if len(line) > config.gdb_log_max:
+                line = f"{line[: config.gdb_log_max]}... ({len(line) - config.gdb_log_max} more characters)"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+class Response(Sequence):
+    """
+    The records of one command, or of a wait for events, in arrival order.
+
+    Lookups by type, message and token go through an index that is built once per
+    record, so asking the same response several questions does not rescan it.
+    """
+
+    __slots__ = ("records", "_index", "_tokens", "_indexed")
+
+    def __init__(self, records=()):
+        self.records: list[Record] = list(records)
+        # (type, message) -> records, with None standing for any type or any message
+        self._index: dict[tuple[str | None, str | None], list[Record]] = {}
+        self._tokens: dict[int, Record] = {}
+        self._indexed = 0
+
+    def __getitem__(self, i):
+        return self.records[i]
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return self.records == list(other)
+
+    def __repr__(self) -> str:
+        return repr(self.records)
+
+    def append(self, r: Record) -> None:
+        self.records.append(r)
+
+    def extend(self, records) -> None:
+        self.records.extend(records)
+
+    def _update(self) -> None:
+        for r in self.records[self._indexed :]:
+            for key in ((r.type, r.message), (r.type, None), (None, r.message), (None, None)):
+                self._index.setdefault(key, []).append(r)
+            if r.token is not None and r.type == "result":
+                self._tokens[r.token] = r
+        self._indexed = len(self.records)
+
+    def find(self, type: str | None = None, message: str | None = None) -> list[Record]:
+        """
+        All records of the given type and message; None matches anything.
+        """
+        self._update()
+        return self._index.get((type, message), [])
+
+    def first(self, type: str | None = None, message: str | None = None) -> Record | None:
+        found = self.find(type, message)
+        return found[0] if found else None
+
+    def has(self, type: str | None = None, message: str | None = None) -> bool:
+        return bool(self.find(type, message))
+
+    def by_token(self, token: int) -> ResultRecord | None:
+        self._update()
+        return self._tokens.get(token)
+
+    @property
+    def result(self) -> ResultRecord | None:
+        """
+        The result record of the command.
+        """
+        return self.first("result")
+
+    @property
+    def payload(self) -> dict:
+        """
+        Payload of the result record, empty if there is none.
+        """
+        result = self.result
+        return (result.payload if result is not None else None) or {}
+
+    @property
+    def stopped_event(self) -> AsyncRecord | None:
+        """
+        The last *stopped record, i.e. where the target is stopped now.
+        """
+        found = self.find("notify", "stopped")
+        return found[-1] if found else None
+
+    @property
+    def bkpt_number(self) -> str | None:
+        """
+        Number of the breakpoint a -break-insert created.
+        """
+        return self.payload.get("bkpt", {}).get("number")
+
+    def hit(self, bkpt_number: str | int) -> bool:
+        """
+        Whether the target stopped at breakpoint bkpt_number.
+        """
+        return any(r.hit(bkpt_number) for r in self.find("notify", "stopped"))
@@ -0,0 +1,279 @@
+"""
+GDB/MI Session
+"""
+
+import itertools
+import os
+import select
+import signal
+import socket
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from pygdbmi.gdbcontroller import GdbController
+
+from ..config import config
+from .mi import parse_line
+from .records import Record, Response
+
+_STREAM_TYPES = ("console", "log", "target")
+
+
+class GdbSession:
+    """
+    A GDB subprocess driven over MI.
+
+    Every command is prefixed with a numeric token. A reader thread parses GDB's
+    output as it arrives and resolves the Future of the command whose token the
+    result record carries, so several commands can be in flight at once. Stream
+    records are attached to the oldest command still waiting for its result (GDB
+    executes commands in order). Async records such as *stopped and =notify, and
+    anything arriving while no command is outstanding, go to an event queue.
+    """
+
+    def __init__(self, command: list[str], log):
+        self.controller = GdbController(command=command)
+        self.process = self.controller.gdb_process
+        self._init_state(log)
+        self._reader = threading.Thread(target=self._read_loop, name="gdb-reader", daemon=True)
+        self._reader.start()
+
+    def _init_state(self, log) -> None:
+        self.log = log
+        self._tokens = itertools.count(1)
+        self._seqs = itertools.count(1)
+        # token -> (future, records collected for it so far), in submission order
+        self._pending: dict[int, tuple[Future, Response]] = {}
+        self._events = deque(maxlen=config.gdb_event_backlog)
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        # bumped whenever the target runs or stops, invalidating cached target state
+        self.generation = 0
+        # between *running and *stopped; with mi-async off GDB reads no commands then
+        self.running = False
+        # register name -> value, valid for self.generation
+        self.register_cache: dict[str, int | str] = {}
+        # register name -> number, filled on first use
+        self.register_numbers: dict[str, int] | None = None
+        # identifies the (gdb binary, vmlinux build-id, QEMU version) triple for the on-disk cache
+        self.cache_key: list | None = None
+        # called on the reader thread with every async record, see add_listener
+        self._listeners: list = []
+        # written to whenever an event is queued, see fileno
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+
+    def _read_loop(self) -> None:
+        stdout = self.process.stdout.fileno()
+        stderr = self.process.stderr.fileno()
+        partial = b""
+        try:
+            while True:
+                ready, _, _ = select.select([stdout, stderr], [], [])
+                if stderr in ready:
+                    try:
+                        data = os.read(stderr, 65536)
+                    except BlockingIOError:
+                        data = None
+                    if data:
+                        self.log.debug("GDB stderr: %s", data.decode(errors="replace").rstrip())
+                if stdout not in ready:
+                    continue
+                try:
+                    data = os.read(stdout, 65536)
+                except BlockingIOError:
+                    continue
+                if not data:
+                    break
+                lines = (partial + data).split(b"\n")
+                partial = lines.pop()
+                for line in lines:
+                    line = line.rstrip(b"\r").decode(errors="replace")
+                    if line and line.rstrip() != "(gdb)":
+                        self._dispatch(parse_line(line))
+        except (OSError, ValueError):
+            # the pipes were closed under us by exit()
+            pass
+        finally:
+            self._close(EOFError("GDB exited"))
+
+    def _dispatch(self, r: Record) -> None:
+        with self._cond:
+            if r.type == "result" and r.token in self._pending:
+                future, records = self._pending.pop(r.token)
+                records.append(r)
+                future.set_result(records)
+                return
+            r.seq = next(self._seqs)
+            if r.type == "notify" and r.message in ("running", "stopped", "register-changed"):
+                self.generation += 1
+                self.register_cache = {}
+                if r.message != "register-changed":
+                    self.running = r.message == "running"
+            if r.type != "result" and self._notify_listeners(r):
+                return
+            if r.type in _STREAM_TYPES and self._pending:
+                next(iter(self._pending.values()))[1].append(r)
+                return
+            if r.type == "notify" and r.message == "running":
+                # the target resumed, so stops queued before this are stale
+                self._drop_stale_stops()
+            self._events.append(r)
+            self._cond.notify_all()
+        self._wake()
+
+    def _drop_stale_stops(self) -> None:
+        # with self._cond held
+        stale = [e for e in self._events if e.type == "notify" and e.message == "stopped"]
+        for e in stale:
+            self._events.remove(e)
+
+    def _resumes(self, command: str) -> bool:
+        return command.startswith("-exec-") and not command.startswith("-exec-interrupt")
+
+    def _notify_listeners(self, r: Record) -> bool:
+        consumed = False
+        for listener in self._listeners:
+            try:
+                consumed = bool(listener(r)) or consumed
+            except Exception:
+                self.log.exception("GDB event listener failed on %s", r)
+        return consumed
+
+    def _close(self, error: Exception) -> None:
+        with self._cond:
+            self._closed = True
+            for future, _ in self._pending.values():
+                future.set_exception(error)
+            self._pending.clear()
+            self._cond.notify_all()
+        self._wake()
+
+    def _wake(self) -> None:
+        try:
+            self._wakeup_w.send(b"\0")
+        except OSError:
+            # full already, which wakes the waiter just as well
+            pass
+
+    def fileno(self) -> int:
+        """
+        A descriptor that turns readable when an event is queued or the session closes, so
+        waits can select on GDB together with other channels. Call clear_wakeup before
+        looking at the queue, so nothing queued after the look goes unnoticed.
+        """
+        return self._wakeup_r.fileno()
+
+    def clear_wakeup(self) -> None:
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except OSError:
+            pass
+
+    def add_listener(self, listener) -> None:
+        """
+        Call listener(record) for every async and stream record, e.g. to count stops, before it is
+        queued or attached to a command. A listener returning True consumes the record, which is then
+        dropped. Listeners run on the reader thread with the session locked, so they must not wait for GDB.
+        """
+        with self._cond:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener) -> None:
+        with self._cond:
+            self._listeners.remove(listener)
+
+    def submit(self, command: str) -> Future:
+        """
+        Send an MI command without waiting for it.
+        The returned Future resolves to the records of the command, ending with its result record.
+        """
+        future = Future()
+        # commands are registered and written in the same order; the write happens outside _cond,
+        # which the reader needs to drain GDB's output while a long batch fills its input
+        with self._write_lock:
+            with self._cond:
+                if self._closed:
+                    raise EOFError("GDB exited")
+                if self._resumes(command):
+                    # ^running comes back before *running, so a stop still queued from an earlier
+                    # command would otherwise be taken for the stop of this one
+                    self._drop_stale_stops()
+                token = next(self._tokens)
+                self._pending[token] = (future, Response())
+            self.process.stdin.write(f"{token}{command}\n".encode())
+            self.process.stdin.flush()
+        return future
+
+    def write(self, command: str, timeout: float = config.wait_timeout) -> Response:
+        """
+        Send an MI command and return its records, ending with its result record.
+        """
+        try:
+            return self.submit(command).result(timeout)
+        except TimeoutError:
+            raise TimeoutError(f"Timeout waiting for GDB to answer '{command}'") from None
+
+    def wait_event(self, predicate, timeout: float = config.wait_timeout, what: str = "event") -> Response:
+        """
+        Take events off the queue until one satisfies predicate; that event is the last one returned.
+        Raises TimeoutError if it does not show up within timeout seconds.
+        """
+        deadline = time.monotonic() + timeout
+        events = []
+        with self._cond:
+            while True:
+                while self._events:
+                    r = self._events.popleft()
+                    events.append(r)
+                    if predicate(r):
+                        return Response(events)
+                if self._closed:
+                    raise EOFError("GDB exited")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    self._events.extendleft(reversed(events))
+                    raise TimeoutError(f"Timeout waiting for GDB {what}")
+
+    def queued(self, r: Record) -> bool:
+        """
+        Whether the event r is still queued, i.e. no wait_event has taken it and it was not dropped.
+        """
+        with self._cond:
+            for e in reversed(self._events):
+                if e is r:
+                    return True
+                if e.seq < r.seq:
+                    break
+            return False
+
+    def wait_stopped(self, timeout: float = config.wait_timeout) -> Response:
+        """
+        Return the queued events up to and including the next *stopped record.
+        """
+        return self.wait_event(lambda r: r.type == "notify" and r.message == "stopped", timeout, "to stop")
+
+    def interrupt(self, timeout: float = config.wait_timeout) -> Response:
+        """
+        Stop a running target the way Ctrl-C in GDB does, and wait for the *stopped record.
+        """
+        self.process.send_signal(signal.SIGINT)
+        return self.wait_stopped(timeout)
+
+    def reset(self) -> None:
+        """
+        Drop queued events and cached target state, e.g. before connecting to another target.
+        """
+        with self._cond:
+            self._events.clear()
+            self.generation += 1
+            self.register_cache = {}
+
+    def exit(self) -> None:
+        self.controller.exit()
+        self._reader.join(timeout=config.wait_timeout)
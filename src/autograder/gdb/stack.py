@@ -2,10 +2,11 @@
 GDB/MI Stack Manipulation Commands
 """
 
+from .records import Response
 from .utils import write
 
 
-def stack_list_frames(test, low_frame: int = 0, high_frame: int = 0) -> list[dict]:
+def stack_list_frames(test, low_frame: int = 0, high_frame: int = 0) -> Response:
     """
     The corresponding GDB commands are ‘backtrace’ and ‘where’.
     """
@@ -2,10 +2,11 @@
 GDB/MI Target Manipulation Commands
 """
 
+from .records import Response
 from .utils import write
 
 
-def target_select(test, target_type: str, parameters: str) -> list[dict]:
+def target_select(test, target_type: str, parameters: str) -> Response:
     """
     The corresponding GDB command is ‘target’.
     Example: -target-select remote /dev/ttya
@@ -2,20 +2,58 @@
 Global Helper Function
 """
 
+from concurrent.futures import Future
 
-def write(test, command: str) -> list[dict]:
-    responses = test.gdb.write(command)
+from .. import timing
+from ..config import config
+from .records import LogView, Response
+
+
+def write(test, command: str, timeout: float = config.wait_timeout, raise_error_on_timeout: bool = True) -> Response:
     test.gdb_log.debug("GDB command: %s", command)
-    for r in responses:
-        test.gdb_log.debug("GDB response: %s", r)
+    try:
+        with timing.span(test, "gdb", command.split(" ", 1)[0], command):
+            responses = test.gdb.write(command, timeout)
+    except TimeoutError:
+        if raise_error_on_timeout:
+            raise
+        test.gdb_log.debug("GDB command timed out: %s", command)
+        return Response()
+    test.gdb_log.debug("GDB response: %s", LogView(responses))
     return responses
 
 
+def submit(test, command: str) -> Future:
+    """
+    Send a command without waiting for its result, so several commands can be pipelined.
+    """
+    test.gdb_log.debug("GDB command: %s", command)
+    return test.gdb.submit(command)
+
+
+def write_many(test, commands: list[str], timeout: float = config.wait_timeout) -> list[Response]:
+    """
+    Pipeline commands to GDB and return the responses of each, in order.
+    """
+    futures = [submit(test, c) for c in commands]
+    results = []
+    for command, future in zip(commands, futures, strict=True):
+        try:
+            responses = future.result(timeout)
+        except TimeoutError:
+            raise TimeoutError(f"Timeout waiting for GDB to answer '{command}'") from None
+        test.gdb_log.debug("GDB response: %s", LogView(responses))
+        results.append(responses)
+    return results
+
+
 def check_responses(
-    response: list[dict],
+    response: Response | list[dict],
     message: str = None,
     type: str = None,
 ) -> bool:
+    if isinstance(response, Response):
+        return response.has(type, message)
     for r in response:
         if (type is None or r.get("type") == type) and (message is None or r.get("message") == message):
             return True
@@ -0,0 +1,106 @@
+"""
+Construction of the QEMU machine and GDB session a test runs against.
+"""
+
+import os
+import uuid
+
+from qemu.machine import QEMUMachine
+
+from . import elf
+from .config import config
+from .gdb.session import GdbSession
+
+GDB_COMMAND = ["gdb-multiarch", "--nx", "--quiet", "--interpreter=mi3"]
+
+
+def gdbstub(sock_dir: str, port: str = "auto") -> tuple[list[str], str]:
+    """
+    QEMU arguments for the gdbstub and the matching GDB remote target.
+    Port "auto" puts the gdbstub on a UNIX socket in sock_dir.
+    """
+    if port == "auto":
+        path = os.path.join(sock_dir, "gdb.sock")
+        return ["-chardev", f"socket,id=gdbstub,path={path},server=on,wait=off", "-gdb", "chardev:gdbstub"], path
+    return ["-gdb", f"tcp::{port}"], f"localhost:{port}"
+
+
+def new_machine(
+    qemu_bin: str,
+    workdir: str,
+    sock_dir: str,
+    console_log: str,
+    gdbstub_args: list[str],
+    incoming: str | None = None,
+) -> QEMUMachine:
+    """
+    Create (but do not launch) a machine that starts halted, waiting for GDB.
+    """
+    vm = QEMUMachine(
+        qemu_bin,
+        name=str(uuid.uuid4()),
+        base_temp_dir=workdir,
+        sock_dir=sock_dir,
+        console_log=console_log,
+    )
+    vm.add_args(*config.qemu_args)
+    vm.add_args(*gdbstub_args)
+    if incoming is not None:
+        vm.add_args("-incoming", f"file:{incoming}")
+    vm.set_machine("virt")
+    vm.set_console()
+    vm.set_qmp_monitor()
+    # 调试用 QMP monitor backdoor socket
+    # 可使用 qmp-shell 连接
+    # https://www.qemu.org/docs/master/devel/testing/functional.html#debugging-hung-qemu
+    # sockfile = os.path.join(workdir, f"qemu-backdoor-{name}.sock")
+    # vm.add_args(
+    #     "-chardev",
+    #     f"socket,id=backdoor,path={sockpath},server=on,wait=off",
+    #     "-mon",
+    #     "chardev=backdoor,mode=control",
+    # )
+    return vm
+
+
+def index_cache_dir() -> str | None:
+    if not (config.gdb_index_cache and config.cache_dir):
+        return None
+    return os.path.join(config.cache_dir, "gdb-index")
+
+
+def gdb_command() -> list[str]:
+    """
+    The command line GDB is started with.
+    With the index cache enabled, GDB stores the symbol index it builds for vmlinux under
+    its build-id and later sessions on the same kernel build load that instead of the DWARF.
+    """
+    cmd = list(GDB_COMMAND)
+    directory = index_cache_dir()
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+        # GDB 13 起是 "enabled on"，更早的版本只认 "on"，不认识的那条只会报错不会退出
+        cmd += [
+            "-iex",
+            f"set index-cache directory {directory}",
+            "-iex",
+            "set index-cache enabled on",
+            "-iex",
+            "set index-cache on",
+        ]
+    return cmd
+
+
+def index_cached(vmlinux_path: str) -> bool:
+    """
+    Whether GDB's index cache already holds an index for this vmlinux build.
+    """
+    directory = index_cache_dir()
+    build_id = elf.build_id(vmlinux_path)
+    if directory is None or build_id is None:
+        return False
+    return os.path.exists(os.path.join(directory, f"{build_id}.gdb-index"))
+
+
+def new_gdb(log) -> GdbSession:
+    return GdbSession(gdb_command(), log)
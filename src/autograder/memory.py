@@ -0,0 +1,85 @@
+"""
+Guest memory access.
+
+Reads pick their transport by size. Small virtual reads go through GDB; larger
+ranges and physical memory are dumped by QEMU with memsave/pmemsave into a file on
+tmpfs, which is mapped into this process and returned without copying.
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+
+from . import gdb
+from .config import config
+from .qemu import monitor
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def read(test, address: int, size: int, physical: bool = False) -> memoryview:
+    """
+    Read size bytes of guest memory at address, a virtual address unless physical is set.
+    """
+    if size == 0:
+        return memoryview(b"")
+    if not physical and size <= config.memory_gdb_max:
+        return memoryview(_read_gdb(test, address, size))
+    return _read_dump(test, address, size, physical)
+
+
+def read_array(test, address: int, count: int, fmt: str = "Q", physical: bool = False):
+    """
+    Read count items of the struct format character fmt, e.g. "Q" for 64-bit words.
+    Returns a NumPy array if NumPy is installed, a memoryview cast to fmt otherwise.
+    Items are little-endian, as on RISC-V; the memoryview uses the host byte order.
+    """
+    view = read(test, address, count * struct.calcsize(fmt), physical)
+    if np is not None:
+        return np.frombuffer(view, dtype=np.dtype(fmt).newbyteorder("<"))
+    return view.cast(fmt)
+
+
+def read_u64(test, address: int, physical: bool = False) -> int:
+    return int.from_bytes(read(test, address, 8, physical), "little")
+
+
+def _read_gdb(test, address: int, size: int) -> bytes:
+    response = gdb.data_read_memory_bytes(test, hex(address), size, ignore_error=False)
+    result = response.result
+    if result is None or result.message != "done":
+        raise Exception(f"Failed to read {size} bytes at {address:#x}: {result and result.error}")
+    blocks = sorted(result.payload["memory"], key=lambda b: int(b["begin"], 16))
+    data = b"".join(bytes.fromhex(b["contents"]) for b in blocks)
+    if len(data) < size:
+        raise Exception(f"Only {len(data)} of {size} bytes at {address:#x} are readable")
+    return data
+
+
+def _dump_dir() -> str:
+    # tmpfs 上的文件 mmap 之后不会再落盘
+    if os.path.isdir(config.memory_dump_dir) and os.access(config.memory_dump_dir, os.W_OK):
+        return config.memory_dump_dir
+    return tempfile.gettempdir()
+
+
+def _read_dump(test, address: int, size: int, physical: bool) -> memoryview:
+    fd, path = tempfile.mkstemp(dir=_dump_dir(), prefix="autograder_mem_")
+    os.close(fd)
+    try:
+        if physical:
+            monitor.pmemsave(test, address, size, path)
+        else:
+            monitor.memsave(test, address, size, path)
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size < size:
+                raise Exception(f"Failed to dump {size} bytes at {address:#x}")
+            mapping = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+    finally:
+        # the mapping keeps the memory alive, the name is no longer needed
+        os.unlink(path)
+    return memoryview(mapping)
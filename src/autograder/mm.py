@@ -0,0 +1,221 @@
+"""
+Sv39 page tables of the guest.
+
+The root table is found through satp. Page-table pages are read from physical
+memory in bulk, one QEMU dump per run of nearby pages, and their entries decoded
+a page at a time. Tables and translations are cached until the target runs
+again, so repeated checks while it is stopped do not touch the guest.
+"""
+
+import weakref
+from dataclasses import dataclass
+
+from . import gdb, memory
+
+PTE_V = 1 << 0
+PTE_R = 1 << 1
+PTE_W = 1 << 2
+PTE_X = 1 << 3
+PTE_U = 1 << 4
+PTE_G = 1 << 5
+PTE_A = 1 << 6
+PTE_D = 1 << 7
+
+SATP_MODE_SV39 = 8
+PAGE_SIZE = 4096
+LEVELS = 3
+
+# page-table pages closer than this are read with a single dump
+_MAX_GAP = 16 * PAGE_SIZE
+
+
+@dataclass
+class Mapping:
+    """
+    A leaf PTE: size bytes of virtual memory at va mapped to pa, with the PTE flag bits.
+    """
+
+    va: int
+    pa: int
+    size: int
+    flags: int
+    level: int
+
+    def allows(self, flags: int) -> bool:
+        return self.flags & flags == flags
+
+
+def _ppn(pte: int) -> int:
+    return (pte >> 10) & ((1 << 44) - 1)
+
+
+def _canonical(va: int) -> int:
+    # bits 63..39 copy bit 38
+    if va & (1 << 38):
+        return va | (((1 << 64) - 1) & ~((1 << 39) - 1))
+    return va
+
+
+def _valid_entries(entries) -> list[tuple[int, int]]:
+    """
+    (index, pte) of the valid entries of a page-table page.
+    """
+    if memory.np is not None:
+        index = memory.np.flatnonzero(entries & PTE_V)
+        return list(zip(index.tolist(), entries[index].tolist(), strict=True))
+    return [(i, pte) for i, pte in enumerate(entries) if pte & PTE_V]
+
+
+class PageTable:
+    """
+    The page table rooted at satp, as seen while the target is stopped.
+    """
+
+    def __init__(self, test, satp: int, generation: int):
+        self.test = test
+        self.satp = satp
+        self.generation = generation
+        self.root = (satp & ((1 << 44) - 1)) << 12
+        # physical address -> 512 entries
+        self.pages: dict[int, object] = {}
+        # virtual page number -> leaf mapping covering it, or None if unmapped
+        self.tlb: dict[int, Mapping | None] = {}
+        self.complete = False
+
+    def fetch(self, addresses) -> None:
+        """
+        Read the page-table pages at the given physical addresses that are not cached yet.
+        """
+        missing = sorted({pa for pa in addresses if pa not in self.pages})
+        runs: list[list[int]] = []
+        for pa in missing:
+            if runs and pa - runs[-1][-1] <= _MAX_GAP:
+                runs[-1].append(pa)
+            else:
+                runs.append([pa])
+        for run in runs:
+            start = run[0]
+            entries = memory.read_array(self.test, start, (run[-1] + PAGE_SIZE - start) // 8, physical=True)
+            for pa in run:
+                offset = (pa - start) // 8
+                self.pages[pa] = entries[offset : offset + 512]
+
+    def entries(self, pa: int):
+        if pa not in self.pages:
+            self.fetch([pa])
+        return self.pages[pa]
+
+    def prefetch(self) -> None:
+        """
+        Read the whole table, one level at a time.
+        """
+        if self.complete:
+            return
+        tables = [self.root]
+        for _ in range(LEVELS):
+            self.fetch(tables)
+            tables = [
+                _ppn(pte) << 12
+                for pa in tables
+                for _, pte in _valid_entries(self.pages[pa])
+                if not pte & (PTE_R | PTE_X)
+            ]
+        self.complete = True
+
+    def lookup(self, va: int) -> Mapping | None:
+        """
+        The leaf mapping that translates va, or None if va is not mapped.
+        """
+        vpn = va >> 12
+        if vpn in self.tlb:
+            return self.tlb[vpn]
+        found = None
+        if _canonical(va & ((1 << 39) - 1)) == va:
+            pa = self.root
+            for level in range(LEVELS - 1, -1, -1):
+                pte = int(self.entries(pa)[(va >> (12 + 9 * level)) & 0x1FF])
+                if not pte & PTE_V:
+                    break
+                if pte & (PTE_R | PTE_X):
+                    size = PAGE_SIZE << (9 * level)
+                    found = Mapping(va & ~(size - 1), _ppn(pte) << 12, size, pte & 0xFF, level)
+                    break
+                pa = _ppn(pte) << 12
+        self.tlb[vpn] = found
+        return found
+
+    def mappings(self) -> list[Mapping]:
+        """
+        Every leaf mapping of the table, by virtual address.
+        """
+        self.prefetch()
+        found = []
+        tables = [(self.root, 0)]
+        for level in range(LEVELS - 1, -1, -1):
+            next_tables = []
+            for pa, prefix in tables:
+                for index, pte in _valid_entries(self.pages[pa]):
+                    va = prefix | (index << (12 + 9 * level))
+                    if pte & (PTE_R | PTE_X):
+                        size = PAGE_SIZE << (9 * level)
+                        found.append(Mapping(_canonical(va), _ppn(pte) << 12, size, pte & 0xFF, level))
+                    elif level > 0:
+                        next_tables.append((_ppn(pte) << 12, va))
+            tables = next_tables
+        found.sort(key=lambda m: m.va)
+        return found
+
+
+_tables: weakref.WeakKeyDictionary[object, PageTable] = weakref.WeakKeyDictionary()
+
+
+def page_table(test) -> PageTable:
+    """
+    The page table the hart currently translates through.
+    Cached per GDB session until the target runs again or satp changes.
+    """
+    session = test.gdb
+    satp = gdb.registers(test, ["satp"])["satp"]
+    table = _tables.get(session)
+    if table is None or table.generation != session.generation or table.satp != satp:
+        if satp >> 60 != SATP_MODE_SV39:
+            raise Exception(f"satp {satp:#x} does not select Sv39 translation")
+        table = PageTable(test, satp, session.generation)
+        _tables[session] = table
+    return table
+
+
+def lookup(test, va: int) -> Mapping | None:
+    return page_table(test).lookup(va)
+
+
+def translate(test, va: int) -> int | None:
+    """
+    Physical address va translates to, or None if it is not mapped.
+    """
+    m = lookup(test, va)
+    if m is None:
+        return None
+    return m.pa + (va - m.va)
+
+
+def mappings(test) -> list[Mapping]:
+    return page_table(test).mappings()
+
+
+def range_mapped(test, va: int, size: int, flags: int = PTE_V, pa: int | None = None) -> bool:
+    """
+    Whether every page of [va, va + size) is mapped with at least flags,
+    and, if pa is given, mapped linearly onto [pa, pa + size).
+    """
+    table = page_table(test)
+    table.prefetch()
+    addr = va
+    while addr < va + size:
+        m = table.lookup(addr)
+        if m is None or not m.allows(flags):
+            return False
+        if pa is not None and m.pa + (addr - m.va) != pa + (addr - va):
+            return False
+        addr = m.va + m.size
+    return True
@@ -0,0 +1,184 @@
+"""
+Warm pool of pre-launched QEMU machines and symbol-loaded GDB sessions.
+
+Tests check out a halted machine and a GDB that has already loaded vmlinux,
+and hand them back in tearDown. Returned machines are reset and returned
+GDB sessions disconnected and cleared, until they reach config.pool_max_reuse
+uses or fail a health check; then they are dropped, and fresh ones are
+launched when a checkout finds the pool empty rather than in tearDown.
+"""
+
+import atexit
+import logging
+import os
+import shutil
+import tempfile
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass
+
+from qemu.machine import QEMUMachine
+
+from . import machine
+from .config import config
+from .gdb.session import GdbSession
+from .qemu import console, monitor
+
+# how long a GDB left with a running target gets to stop it before it is retired
+_INTERRUPT_TIMEOUT = 2.0
+
+
+@dataclass
+class PooledVM:
+    vm: QEMUMachine
+    sock_dir: str
+    gdb_target: str
+    console_log: str
+    uses: int = 0
+    # where the output of the current checkout starts in console_log, which spans every use
+    log_start: int = 0
+
+
+@dataclass
+class PooledGdb:
+    session: GdbSession
+    # -file-exec-and-symbols, still running in GDB when the session is spawned
+    symbols: Future
+    uses: int = 0
+
+
+class Pool:
+    def __init__(self, size: int = config.pool_size, max_reuse: int = config.pool_max_reuse):
+        self.size = size
+        self.max_reuse = max_reuse
+        # 放在 /tmp 下，避免 UNIX socket 路径超长
+        self.dir = tempfile.mkdtemp(prefix="autograder_pool_")
+        self.vms: deque[PooledVM] = deque()
+        self.gdbs: deque[PooledGdb] = deque()
+
+    def _spawn_vm(self) -> PooledVM:
+        sock_dir = tempfile.mkdtemp(dir=self.dir)
+        gdbstub_args, gdb_target = machine.gdbstub(sock_dir)
+        console_log = os.path.join(sock_dir, "console.log")
+        vm = machine.new_machine(config.qemu_bin, sock_dir, sock_dir, console_log, gdbstub_args)
+        vm.launch()
+        return PooledVM(vm, sock_dir, gdb_target, console_log)
+
+    def _spawn_gdb(self) -> PooledGdb:
+        session = machine.new_gdb(logging.getLogger("gdb"))
+        # 符号在 GDB 进程里加载，不阻塞当前测试
+        symbols = session.submit(f"-file-exec-and-symbols {config.vmlinux_path}")
+        return PooledGdb(session, symbols)
+
+    def _discard_vm(self, entry: PooledVM) -> None:
+        try:
+            entry.vm.shutdown()
+        finally:
+            shutil.rmtree(entry.sock_dir, ignore_errors=True)
+
+    def _discard_gdb(self, entry: PooledGdb) -> None:
+        entry.session.exit()
+
+    def fill(self) -> None:
+        """
+        Top the pool up to its size.
+        """
+        while len(self.gdbs) < self.size:
+            self.gdbs.append(self._spawn_gdb())
+        while len(self.vms) < self.size:
+            self.vms.append(self._spawn_vm())
+
+    def checkout_vm(self) -> PooledVM:
+        while self.vms:
+            entry = self.vms.popleft()
+            if entry.vm.is_running():
+                break
+            self._discard_vm(entry)
+        else:
+            entry = self._spawn_vm()
+        entry.uses += 1
+        entry.log_start = _file_size(entry.console_log)
+        return entry
+
+    def checkout_gdb(self) -> PooledGdb:
+        while self.gdbs:
+            entry = self.gdbs.popleft()
+            if entry.session.process.poll() is None:
+                break
+            self._discard_gdb(entry)
+        else:
+            entry = self._spawn_gdb()
+        entry.uses += 1
+        return entry
+
+    def save_console_log(self, entry: PooledVM, path: str) -> None:
+        """
+        Copy the console output of the current checkout of entry to path.
+        """
+        try:
+            with open(entry.console_log, "rb") as src, open(path, "wb") as dst:
+                src.seek(entry.log_start)
+                shutil.copyfileobj(src, dst)
+        except FileNotFoundError:
+            pass
+
+    def release(self, test, vm_entry: PooledVM, gdb_entry: PooledGdb) -> None:
+        """
+        Take back what test checked out, recycling it if it is still healthy.
+        The console output of the test is copied to its console log first.
+        """
+        console.console_stream(vm_entry.vm).poll()
+        self.save_console_log(vm_entry, test.console_log_name)
+
+        session = gdb_entry.session
+        try:
+            if gdb_entry.uses >= self.max_reuse or session.process.poll() is not None:
+                raise RuntimeError("GDB session retired")
+            if session.running:
+                # GDB would not read the commands below until the target stopped by itself
+                session.interrupt(_INTERRUPT_TIMEOUT)
+            session.write("-interpreter-exec console delete")
+            session.write("-target-disconnect")
+            session.reset()
+            self.gdbs.append(gdb_entry)
+        except Exception:
+            self._discard_gdb(gdb_entry)
+
+        try:
+            if vm_entry.uses >= self.max_reuse or not vm_entry.vm.is_running():
+                raise RuntimeError("VM retired")
+            monitor.stop(test)
+            monitor.system_reset(test)
+            console.console_stream(vm_entry.vm).clear()
+            self.vms.append(vm_entry)
+        except Exception:
+            self._discard_vm(vm_entry)
+
+    def close(self) -> None:
+        while self.gdbs:
+            self._discard_gdb(self.gdbs.popleft())
+        while self.vms:
+            self._discard_vm(self.vms.popleft())
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+_pool: Pool | None = None
+
+
+def get_pool() -> Pool:
+    """
+    The pool of this process, created and filled on first use.
+    """
+    global _pool
+    if _pool is None:
+        _pool = Pool()
+        atexit.register(_pool.close)
+        _pool.fill()
+    return _pool
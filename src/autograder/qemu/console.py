@@ -1,76 +1,487 @@
 # This implementation is based on test/functional/qemu_test/cmd.py from the QEMU project.
 # Original code by https://gitlab.com/qemu-project/qemu, adapted for ZJU-OS testing.
 
+import base64
+import bisect
+import json
+import re
 import select
 import time
+import weakref
+from collections import deque
+from dataclasses import dataclass
 
+from .. import timing
 from ..config import config
 
 
-def _console_read_line_until_match(test, vm, success, failure):
-    msg = bytes([])
-    done = False
-    while True:
-        c = vm.console_socket.recv(1)
-        if c is None:
-            done = True
-            test.fail(f"EOF in console, expected '{success}'")
-            break
-        msg += c
+@dataclass
+class ConsoleMatch:
+    pattern: str | bytes | re.Pattern
+    # index into the success (or failure) patterns the matcher was built from
+    index: int
+    failure: bool
+    # absolute offsets into the console output of this VM
+    start: int
+    end: int
+    text: bytes
+
+
+class ConsoleTimeoutError(TimeoutError):
+    """
+    Raised when a console wait runs past its deadline.
+    tail holds the last console output received, to show where the guest got stuck.
+    """
+
+    def __init__(self, expected, timeout: float, tail: str):
+        super().__init__(f"Timeout after {timeout}s waiting for {expected} on console, last output:\n{tail}")
+        self.expected = expected
+        self.timeout = timeout
+        self.tail = tail
+
+
+class ConsoleMatcher:
+    """
+    Match a set of success and failure patterns against console output in a single pass.
+
+    str and bytes patterns are matched literally, compiled re.Pattern objects as regular
+    expressions. Either argument may be a single pattern, a list of them or None.
+    All of them are combined into one alternation so every new chunk of
+    output is scanned once regardless of how many patterns are waited for, except
+    for expressions with capturing groups, which are searched on their own so their
+    backreferences and group names keep working. Regular expressions are matched
+    within a line.
+    """
+
+    def __init__(self, success, failure=()):
+        self.success = _patterns(success)
+        self.failure = _patterns(failure)
+        alternatives = []
+        # (index, regex) of expressions with groups of their own, whose numbers and names would
+        # clash inside the alternation, so they are searched one by one
+        self.separate: list[tuple[int, re.Pattern]] = []
+        self.overlap = 0
+        for i, pattern in enumerate(self.success + self.failure):
+            if isinstance(pattern, re.Pattern):
+                source = pattern.pattern
+                if isinstance(source, str):
+                    source = source.encode()
+                # global flags like (?i) are only allowed at the start of the expression, and
+                # pattern.flags already holds them
+                source = _GLOBAL_FLAGS.sub(b"", source)
+                flags = pattern.flags & ~re.UNICODE
+                if pattern.groups:
+                    self.separate.append((i, re.compile(source, flags)))
+                else:
+                    alternatives.append(b"(?P<_p%d>(?%s:%s))" % (i, _inline_flags(flags), source))
+            else:
+                literal = pattern.encode() if isinstance(pattern, str) else pattern
+                self.overlap = max(self.overlap, len(literal) - 1)
+                alternatives.append(b"(?P<_p%d>%s)" % (i, re.escape(literal)))
+        self.has_regex = any(isinstance(p, re.Pattern) for p in self.success + self.failure)
+        self.regex = re.compile(b"|".join(alternatives)) if alternatives else None
+
+    def search(self, data, pos: int = 0, base: int = 0) -> ConsoleMatch | None:
+        """
+        The earliest match of any pattern in data from pos on, with offsets counted from base.
+        """
+        best = None
+        if self.regex is not None:
+            m = self.regex.search(data, pos)
+            if m is not None:
+                best = (m.start(), int(m.lastgroup[2:]), m)
+        for i, regex in self.separate:
+            m = regex.search(data, pos)
+            if m is not None and (best is None or (m.start(), i) < best[:2]):
+                best = (m.start(), i, m)
+        if best is None:
+            return None
+        _, i, m = best
+        failure = i >= len(self.success)
+        pattern = self.failure[i - len(self.success)] if failure else self.success[i]
+        index = i - len(self.success) if failure else i
+        return ConsoleMatch(pattern, index, failure, base + m.start(), base + m.end(), m.group())
+
+
+# leading global inline flag groups, e.g. (?i) or (?im)(?x)
+_GLOBAL_FLAGS = re.compile(rb"\A(?:\(\?[aiLmsux]+\))+")
+
+
+def _inline_flags(flags: int) -> bytes:
+    letters = b""
+    for flag, letter in ((re.IGNORECASE, b"i"), (re.MULTILINE, b"m"), (re.DOTALL, b"s"), (re.VERBOSE, b"x")):
+        if flags & flag:
+            letters += letter
+    return letters
+
+
+def _patterns(patterns) -> list:
+    if patterns is None:
+        return []
+    if isinstance(patterns, (str, bytes, re.Pattern)):
+        return [patterns]
+    return list(patterns)
+
+
+class ConsoleStream:
+    """
+    Buffered reader over a VM console socket.
+
+    Console output is received in large chunks into a rolling buffer. Bytes that
+    were already searched are not searched again, except for a short overlap so
+    that a pattern split across two chunks is still found. Up to window bytes of
+    already consumed output are kept around as context for error messages.
+    """
+
+    def __init__(self, sock, chunk_size: int = config.console_chunk_size, window: int = config.console_window):
+        self.sock = sock
+        self.chunk_size = chunk_size
+        self.window = window
+        self.buffer = bytearray()
+        # absolute console offset of buffer[0]
+        self.base = 0
+        # buffer[:consumed] is behind the last match and never matched again
+        self.consumed = 0
+        # buffer[:scanned] has already been searched without a match
+        self.scanned = 0
+        self.eof = False
+        # ConsoleRecorder that gets a copy of everything received, if any
+        self.recorder: ConsoleRecorder | None = None
+        self.sock.setblocking(False)
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def fill(self, deadline: float | None = None) -> int | None:
+        """
+        Receive the next chunk of console output, waiting until some is available
+        or the time.monotonic() deadline passes.
+        Returns the number of bytes received, 0 on EOF, None on timeout.
+        """
+        while True:
+            try:
+                data = self.sock.recv(self.chunk_size)
+            except BlockingIOError:
+                timeout = None if deadline is None else deadline - time.monotonic()
+                if timeout is not None and timeout <= 0:
+                    return None
+                select.select([self.sock], [], [], timeout)
+                continue
+            if not data:
+                self.eof = True
+                return 0
+            self.buffer += data
+            if self.recorder is not None:
+                self.recorder.feed(data)
+            return len(data)
+
+    def poll(self) -> None:
+        """
+        Receive whatever output is available right now, without waiting.
+        """
+        while self.fill(0):
+            pass
+
+    @property
+    def offset(self) -> int:
+        """
+        Absolute console offset of the end of the output received so far.
+        """
+        return self.base + len(self.buffer)
+
+    def search(self, matcher: ConsoleMatcher) -> ConsoleMatch | None:
+        """
+        Search the unscanned part of the buffer for the earliest match of any pattern.
+        On a match the output up to the end of the match is consumed.
+        """
+        start = max(self.consumed, self.scanned - matcher.overlap)
+        if matcher.has_regex:
+            start = max(self.consumed, min(start, self.buffer.rfind(b"\n", 0, self.scanned) + 1))
+        found = matcher.search(self.buffer, start, self.base)
+        if found is not None:
+            self.consumed = self.scanned = found.end - self.base
+        else:
+            self.scanned = len(self.buffer)
+        # trim in big steps so the buffer is not shifted on every chunk, but never past what was searched
+        if len(self.buffer) > 2 * self.window:
+            self.discard(min(self.scanned, len(self.buffer) - self.window))
+        return found
+
+    def peek(self, matcher: ConsoleMatcher, since: int) -> tuple[ConsoleMatch | None, int]:
+        """
+        Search the unconsumed output after the absolute offset since without consuming any,
+        e.g. to watch for failures while waiting for something else.
+        Returns the earliest match, if any, and where to search from next time.
+        """
+        start = max(self.consumed, since - self.base)
+        found = matcher.search(self.buffer, start, self.base)
+        if found is not None:
+            return found, found.end
+        resume = max(start, len(self.buffer) - matcher.overlap)
+        if matcher.has_regex:
+            resume = max(start, min(resume, self.buffer.rfind(b"\n") + 1))
+        return None, self.base + resume
+
+    def discard(self, end: int) -> None:
+        del self.buffer[:end]
+        self.base += end
+        self.consumed = max(0, self.consumed - end)
+        self.scanned = max(0, self.scanned - end)
+
+    def clear(self) -> None:
+        """
+        Forget all output received so far, including output still queued in the socket.
+        """
+        self.discard(len(self.buffer))
+        while self.fill(0):
+            self.discard(len(self.buffer))
+
+    def tail(self, size: int = 2048) -> str:
+        return self.buffer[-size:].decode(errors="replace")
+
+    def sendall(self, data: bytes, deadline: float | None = None) -> None:
+        """
+        Send data to the console, waiting for room until the time.monotonic() deadline
+        (config.wait_timeout from now by default). Raises ConsoleTimeoutError past it.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + config.wait_timeout
+        start = time.monotonic()
+        view = memoryview(data)
+        while view:
+            try:
+                view = view[self.sock.send(view) :]
+            except BlockingIOError:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0 or not select.select([], [self.sock], [], timeout)[1]:
+                    raise ConsoleTimeoutError(
+                        f"the guest to take {len(view)} more bytes of input", round(deadline - start, 1), self.tail()
+                    ) from None
+
+
+class ConsoleRecorder:
+    """
+    Queryable record of console output, one entry per line.
+
+    Every line is appended to a JSON Lines file together with the time.monotonic()
+    time it started arriving and its absolute byte offset in the console output.
+    The most recent lines, up to window bytes, are also kept in memory. Queries are
+    answered from memory and fall back to the file for older lines, using a sparse
+    offset index to seek close to where they start.
+    """
+
+    # lines between two entries of the file index
+    INDEX_EVERY = 256
+
+    def __init__(self, path: str, offset: int = 0, window: int = config.console_record_window):
+        self.path = path
+        self.window = window
+        self.file = open(path, "wb")
+        # (ts, offset, line) of recent complete lines
+        self.lines: deque[tuple[float, int, bytes]] = deque()
+        self.size = 0
+        self.count = 0
+        # the line still being received
+        self.partial = bytearray()
+        self.partial_ts: float | None = None
+        self.line_start = offset
+        self._index_offsets: list[int] = []
+        self._index_positions: list[int] = []
 
-        if success in msg:
-            done = True
-            break
-        if failure and failure in msg:
-            done = True
-            vm.console_socket.close()
-            test.fail(f"'{failure}' found in console, expected '{success}'")
+    def feed(self, data: bytes) -> None:
+        now = time.monotonic()
+        if self.partial_ts is None:
+            self.partial_ts = now
+        self.partial += data
+        end = self.partial.rfind(b"\n") + 1
+        if not end:
+            return
+        for line in bytes(self.partial[:end]).split(b"\n")[:-1]:
+            self._append(self.partial_ts, line + b"\n")
+            self.partial_ts = now
+        del self.partial[:end]
+        self.partial_ts = now if self.partial else None
+        self.file.flush()
 
-        if c == b"\n":
-            break
+    def _append(self, ts: float, line: bytes) -> None:
+        offset = self.line_start
+        if self.count % self.INDEX_EVERY == 0:
+            self._index_offsets.append(offset)
+            self._index_positions.append(self.file.tell())
+        # size is the raw byte length, which offsets are counted in
+        entry = {"ts": ts, "offset": offset, "size": len(line)}
+        try:
+            entry["text"] = line.decode()
+        except UnicodeDecodeError:
+            # the text would not encode back to the same bytes, keep those as well
+            entry["text"] = line.decode(errors="replace")
+            entry["raw"] = base64.b64encode(line).decode()
+        self.file.write(json.dumps(entry).encode() + b"\n")
+        self.lines.append((ts, offset, line))
+        self.size += len(line)
+        self.count += 1
+        self.line_start += len(line)
+        while self.size > self.window:
+            self.size -= len(self.lines.popleft()[2])
 
-    return done
+    def mark(self) -> int:
+        """
+        A mark for "from here on": the absolute offset of the end of the output recorded so far.
+        """
+        return self.line_start + len(self.partial)
 
+    def lines_since(self, mark: int = 0):
+        """
+        Yield (ts, offset, line) for every line that ends after mark, including an unfinished last line.
+        """
+        oldest = self.lines[0][1] if self.lines else self.line_start
+        if mark < oldest:
+            yield from self._file_lines(mark, oldest)
+        for entry in list(self.lines):
+            if entry[1] + len(entry[2]) > mark:
+                yield entry
+        if self.partial:
+            yield self.partial_ts, self.line_start, bytes(self.partial)
 
-def _console_interaction(test, success_message, failure_message, send_string, keep_sending=False, vm=None):
+    def _file_lines(self, mark: int, stop: int):
+        self.file.flush()
+        i = bisect.bisect_right(self._index_offsets, mark) - 1
+        with open(self.path, "rb") as f:
+            f.seek(self._index_positions[i] if i >= 0 else 0)
+            for raw in f:
+                entry = json.loads(raw)
+                if entry["offset"] >= stop:
+                    break
+                if entry["offset"] + entry["size"] > mark:
+                    raw = entry.get("raw")
+                    line = base64.b64decode(raw) if raw is not None else entry["text"].encode()
+                    yield entry["ts"], entry["offset"], line
+
+    def search_since(self, mark: int, pattern) -> ConsoleMatch | None:
+        """
+        Find the first match of pattern (or of any pattern in a list) in the output after mark.
+        Patterns are interpreted as by ConsoleMatcher and matched within a line.
+        """
+        matcher = ConsoleMatcher(pattern)
+        for _, offset, line in self.lines_since(mark):
+            found = matcher.search(line, max(0, mark - offset), offset)
+            if found is not None:
+                return found
+        return None
+
+    def close(self) -> None:
+        self.file.close()
+
+
+_streams: "weakref.WeakKeyDictionary[object, ConsoleStream]" = weakref.WeakKeyDictionary()
+
+
+def console_stream(vm) -> ConsoleStream:
+    """
+    Get the ConsoleStream of vm, creating it on first use.
+    """
+    sock = vm.console_socket
+    stream = _streams.get(sock)
+    if stream is None:
+        stream = ConsoleStream(sock)
+        _streams[sock] = stream
+    return stream
+
+
+def record_console(test, path: str, vm=None) -> ConsoleRecorder:
+    """
+    Start recording the console of vm (test.vm by default) to path.
+    """
+    stream = console_stream(vm if vm is not None else test.vm)
+    stream.poll()
+    stream.recorder = ConsoleRecorder(path, stream.offset)
+    return stream.recorder
+
+
+def stop_recording_console(test, vm=None) -> None:
+    stream = console_stream(vm if vm is not None else test.vm)
+    if stream.recorder is not None:
+        stream.recorder.close()
+        stream.recorder = None
+
+
+def console_mark(test, vm=None) -> int:
+    """
+    Mark the current end of the console output, to search what comes after it later.
+    The end offset of a ConsoleMatch works as a mark as well, and 0 means since boot.
+    """
+    stream = console_stream(vm if vm is not None else test.vm)
+    stream.poll()
+    return stream.offset
+
+
+def search_console_since(test, mark: int, pattern, vm=None) -> ConsoleMatch | None:
+    """
+    Search the console output after mark for pattern, including output a wait has already consumed.
+    Unlike the wait functions this does not wait for more output, and does not consume any.
+    """
+    stream = console_stream(vm if vm is not None else test.vm)
+    if stream.recorder is None:
+        raise RuntimeError("Console is not being recorded, enable config.console_record")
+    stream.poll()
+    return stream.recorder.search_since(mark, pattern)
+
+
+def _console_wait_until_match(test, stream, matcher, timeout, resend=None):
+    deadline = time.monotonic() + timeout
+    while True:
+        found = stream.search(matcher)
+        if found is not None:
+            if found.failure:
+                stream.sock.close()
+                test.fail(f"'{found.pattern}' found in console, expected {matcher.success}")
+            return found
+        if resend is not None:
+            stream.sendall(resend, deadline)
+            received = stream.fill(min(deadline, time.monotonic() + config.frequency))
+            if received is None and time.monotonic() < deadline:
+                continue
+        else:
+            received = stream.fill(deadline)
+        if received is None:
+            raise ConsoleTimeoutError(matcher.success, timeout, stream.tail())
+        if received == 0:
+            test.fail(f"EOF in console, expected {matcher.success}")
+
+
+def _console_interaction(
+    test, success_message, failure_message, send_string, keep_sending=False, vm=None, timeout=None
+):
     assert not keep_sending or send_string
     assert success_message or send_string
 
     if vm is None:
         vm = test.vm
 
-    timeout = config.wait_timeout
+    if timeout is None:
+        timeout = config.wait_timeout
 
     test.log.debug(
         f"Console interaction: success_msg='{success_message}' "
         + f"failure_msg='{failure_message}' send_string='{send_string}' timeout={timeout}"
     )
 
-    # We'll process console in bytes, to avoid having to
-    # deal with unicode decode errors from receiving
-    # partial utf8 byte sequences
-    success_message_b = None
-    if success_message is not None:
-        success_message_b = success_message.encode()
+    stream = console_stream(vm)
 
-    failure_message_b = None
-    if failure_message is not None:
-        failure_message_b = failure_message.encode()
+    if send_string:
+        stream.sendall(send_string.encode(), time.monotonic() + timeout)
 
-    while True:
-        if send_string:
-            vm.console_socket.sendall(send_string.encode())
-            if not keep_sending:
-                send_string = None  # send only once
-
-        # Only consume console output if waiting for something
-        if success_message is None:
-            if send_string is None:
-                break
-            continue
+    # Only consume console output if waiting for something
+    if success_message is None:
+        return None
 
-        if _console_read_line_until_match(test, vm, success_message_b, failure_message_b):
-            break
+    # We'll process console in bytes, to avoid having to
+    # deal with unicode decode errors from receiving
+    # partial utf8 byte sequences
+    matcher = ConsoleMatcher(success_message, failure_message)
+    resend = send_string.encode() if keep_sending else None
+    with timing.span(test, "console", "wait", str(success_message)):
+        return _console_wait_until_match(test, stream, matcher, timeout, resend)
 
 
 def interrupt_interactive_console_until_pattern(test, success_message, failure_message=None, interrupt_string="\r"):
@@ -78,15 +489,53 @@ def interrupt_interactive_console_until_pattern(test, success_message, failure_m
     _console_interaction(test, success_message, failure_message, interrupt_string, True)
 
 
-def wait_for_console_pattern(test, success_message, failure_message=None, vm=None):
+def wait_for_console_pattern(test, success_message, failure_message=None, vm=None, timeout=None) -> ConsoleMatch:
+    """
+    Wait until success_message shows up on the console.
+    Both arguments may be a single pattern or a list of patterns; the returned
+    ConsoleMatch tells which one fired and where.
+    Raises ConsoleTimeoutError if nothing matches within timeout (config.wait_timeout by default).
+    """
     assert success_message
-    _console_interaction(test, success_message, failure_message, None, vm=vm)
+    return _console_interaction(test, success_message, failure_message, None, vm=vm, timeout=timeout)
+
+
+def wait_for_console_patterns(
+    test, success_messages, failure_message=None, vm=None, timeout=None
+) -> list[ConsoleMatch]:
+    """
+    Wait until every pattern in success_messages has shown up on the console, in any order.
+    The output is scanned once for all of them. Returns the matches in the order given.
+    """
+    assert success_messages
+    if vm is None:
+        vm = test.vm
+    if timeout is None:
+        timeout = config.wait_timeout
+    test.log.debug(
+        f"Console interaction: success_msgs={success_messages} failure_msg='{failure_message}' timeout={timeout}"
+    )
+
+    stream = console_stream(vm)
+    matcher = ConsoleMatcher(success_messages, failure_message)
+    matches = [None] * len(matcher.success)
+    deadline = time.monotonic() + timeout
+    with timing.span(test, "console", "wait_all", str(success_messages)):
+        while None in matches:
+            try:
+                found = _console_wait_until_match(test, stream, matcher, max(0.0, deadline - time.monotonic()))
+            except ConsoleTimeoutError:
+                missing = [p for p, m in zip(matcher.success, matches, strict=True) if m is None]
+                raise ConsoleTimeoutError(missing, timeout, stream.tail()) from None
+            if matches[found.index] is None:
+                matches[found.index] = found
+    return matches
 
 
 def exec_command(test, command):
     _console_interaction(test, None, None, command + "\r")
 
 
-def exec_command_and_wait_for_pattern(test, command, success_message, failure_message=None):
+def exec_command_and_wait_for_pattern(test, command, success_message, failure_message=None) -> ConsoleMatch:
     assert success_message
-    _console_interaction(test, success_message, failure_message, command + "\r")
+    return _console_interaction(test, success_message, failure_message, command + "\r")
@@ -2,48 +2,148 @@
 https://qemu-project.gitlab.io/qemu/interop/qemu-qmp-ref.html
 """
 
+from __future__ import annotations
+
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING
+
 from qemu.machine import QEMUMachine
 from qemu.qmp.message import Message as QMPMessage
 
-from ..testcase import QemuGdbTest
+from .. import cache, timing
+from ..config import config
+
+if TYPE_CHECKING:
+    # testcase imports this module
+    from ..testcase import QemuGdbTest
+
+# per-VM metadata, dropped together with the QEMUMachine
+_qemu_versions: weakref.WeakKeyDictionary[QEMUMachine, str] = weakref.WeakKeyDictionary()
+_supported_qmp_commands: weakref.WeakKeyDictionary[QEMUMachine, set[str]] = weakref.WeakKeyDictionary()
+_qmp_locks: weakref.WeakKeyDictionary[QEMUMachine, threading.RLock] = weakref.WeakKeyDictionary()
+_qmp_locks_guard = threading.Lock()
+
+
+def qmp_lock(vm: QEMUMachine) -> threading.RLock:
+    """
+    The lock every use of vm's QMP connection holds. The legacy QMP client runs one private
+    event loop per connection, which two threads (e.g. executor threads of autograder.aio)
+    must not run at once.
+    """
+    with _qmp_locks_guard:
+        lock = _qmp_locks.get(vm)
+        if lock is None:
+            lock = threading.RLock()
+            _qmp_locks[vm] = lock
+    return lock
+
+
+def supported_commands(test: QemuGdbTest) -> set[str]:
+    """
+    QMP commands supported by the QEMU of test.vm.
+    Cached per VM, and on disk per QEMU binary and version.
+    """
+    vm: QEMUMachine = test.vm
+    commands = _supported_qmp_commands.get(vm)
+    if commands is None:
+        key = [cache.file_key(test.qemu_bin), qemu_version(test)]
+        names = cache.load("qmp-commands", key)
+        if names is None:
+            names = []
+            with qmp_lock(vm):
+                response = vm.qmp("query-commands")
+            if response and "return" in response:
+                for cmd in response["return"]:
+                    name = cmd.get("name")
+                    if name:
+                        names.append(name)
+            if names:
+                cache.store("qmp-commands", key, names)
+        commands = set(names)
+        _supported_qmp_commands[vm] = commands
+    return commands
 
-_supported_qmp_commands = None
 
 def execute(test: QemuGdbTest, command: str, arguments: dict = None) -> QMPMessage:
     vm: QEMUMachine = test.vm
-    global _supported_qmp_commands
-    if _supported_qmp_commands is None:
-        _supported_qmp_commands = set()
-        response = vm.qmp("query-commands")
-        if response and "return" in response:
-            for cmd in response["return"]:
-                name = cmd.get("name")
-                if name:
-                    _supported_qmp_commands.add(name)
-    if command not in _supported_qmp_commands:
+    if command not in supported_commands(test):
         raise RuntimeError(f"QMP command '{command}' not supported by this QEMU")
-    return vm.qmp(command, arguments or {})
+    with timing.span(test, "qmp", command), qmp_lock(vm):
+        return vm.qmp(command, arguments or {})
+
 
 def query_version(test: QemuGdbTest) -> QMPMessage:
-    return execute(test, "query-version")
+    # query-version is always available, and the version keys the supported command cache
+    vm: QEMUMachine = test.vm
+    with timing.span(test, "qmp", "query-version"), qmp_lock(vm):
+        response = vm.qmp("query-version")
+    if response and "return" in response:
+        ver = response["return"]
+        qemu = ver.get("qemu", {})
+        version = f"{qemu.get('major')}.{qemu.get('minor')}.{qemu.get('micro')} {ver.get('package', '')}"
+        _qemu_versions[vm] = version.strip()
+    return response
+
+
+def qemu_version(test: QemuGdbTest) -> str | None:
+    """
+    Version string of the QEMU running test.vm, e.g. "10.1.0 Debian 1:10.1.0+ds-1".
+    """
+    if test.vm not in _qemu_versions:
+        query_version(test)
+    return _qemu_versions.get(test.vm)
+
+
+def event_wait(vm: QEMUMachine, name: str, timeout: float = config.wait_timeout, match: dict = None):
+    """
+    Wait for the QMP event name on vm, returning it, or None on timeout. The lock is only held
+    for short slices, so commands from other threads still get through, e.g. the one causing the event.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        # a float, the legacy client waits forever on other numbers
+        wait = float(max(0.001, min(config.frequency, deadline - time.monotonic())))
+        with qmp_lock(vm):
+            try:
+                return vm.event_wait(name, wait, match)
+            except TimeoutError:
+                pass
+        if time.monotonic() >= deadline:
+            return None
+        # let a thread waiting for the lock take it before the next slice
+        time.sleep(0.001)
+
+
+def stop(test: QemuGdbTest):
+    execute(test, "stop")
+
+
+def system_reset(test: QemuGdbTest):
+    execute(test, "system_reset")
+
+
+def query_status(test: QemuGdbTest) -> QMPMessage:
+    return execute(test, "query-status")
+
+
+def migrate(test: QemuGdbTest, uri: str):
+    execute(test, "migrate", {"uri": uri})
+
+
+def query_migrate(test: QemuGdbTest) -> QMPMessage:
+    return execute(test, "query-migrate")
+
 
 def memsave(test: QemuGdbTest, val: int, size: int, filename: str, cpu_index: int = 0):
-    args = {
-        "val": val,
-        "size": size,
-        "filename": filename,
-        "cpu-index": cpu_index
-    }
+    args = {"val": val, "size": size, "filename": filename, "cpu-index": cpu_index}
     # Remove cpu-index if default (QEMU uses 0 by default)
     if cpu_index == 0:
         args.pop("cpu-index")
     execute(test, "memsave", args)
 
+
 def pmemsave(test: QemuGdbTest, val: int, size: int, filename: str):
-    args = {
-        "val": val,
-        "size": size,
-        "filename": filename
-    }
+    args = {"val": val, "size": size, "filename": filename}
     execute(test, "pmemsave", args)
-
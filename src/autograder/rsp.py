@@ -0,0 +1,644 @@
+"""
+GDB Remote Serial Protocol Backend
+
+RspSession talks to QEMU's gdbstub directly, with no GDB process in between.
+It stands in for GdbSession: it accepts the MI commands autograder.gdb sends
+for registers, memory, breakpoints and execution control, and answers them with
+the records GDB would send, so the autograder.gdb functions work unchanged.
+
+Names are resolved with the ELF symbol index of the kernel; there is no DWARF.
+Function breakpoints stop at the first instruction rather than after the
+prologue, expressions are limited to symbols, registers and numbers, and
+-exec-finish relies on ra still holding the return address, as it does at
+function entry.
+See https://sourceware.org/gdb/current/onlinedocs/gdb#Remote-Protocol
+"""
+
+import itertools
+import os
+import queue
+import shlex
+import socket
+import struct
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import Future
+
+from . import elf, symbols
+from .config import config
+from .gdb.records import AsyncRecord, Response, ResultRecord
+from .gdb.session import GdbSession
+
+SIGINT = 2
+SIGTRAP = 5
+_SIGNALS = {SIGINT: "SIGINT", SIGTRAP: "SIGTRAP"}
+
+# register layout of a riscv64 target that does not describe itself
+_FALLBACK_REGISTERS = [
+    "zero", "ra", "sp", "gp", "tp", "t0", "t1", "t2", "fp", "s1", "a0", "a1", "a2", "a3", "a4", "a5",
+    "a6", "a7", "s2", "s3", "s4", "s5", "s6", "s7", "s8", "s9", "s10", "s11", "t3", "t4", "t5", "t6", "pc",
+]  # fmt: skip
+
+
+class RspError(Exception):
+    """
+    A command the backend cannot carry out, reported to the caller as ^error.
+    """
+
+
+def _checksum(data: bytes) -> bytes:
+    return b"%02x" % (sum(data) & 0xFF)
+
+
+def _decode(data: bytes) -> bytes:
+    """
+    Undo the run-length encoding and the } escapes of a packet.
+    """
+    if b"}" not in data and b"*" not in data:
+        return data
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        c = data[i]
+        if c == 0x7D:
+            i += 1
+            out.append(data[i] ^ 0x20)
+        elif c == 0x2A:
+            i += 1
+            out += out[-1:] * (data[i] - 29)
+        else:
+            out.append(c)
+        i += 1
+    return bytes(out)
+
+
+class RspConnection:
+    """
+    Packet framing over the gdbstub socket.
+
+    A reader thread takes packets off the socket. Replies to requests go to a
+    queue; while the target runs, the stop reply it eventually sends goes to
+    on_stop instead. Acks are dropped as soon as the stub agrees to no-ack mode.
+    """
+
+    def __init__(self, target: str, on_stop, log):
+        if os.path.exists(target):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(target)
+        else:
+            host, _, port = target.rpartition(":")
+            self.sock = socket.create_connection((host or "localhost", int(port)), config.wait_timeout)
+            self.sock.settimeout(None)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.on_stop = on_stop
+        self.log = log
+        self.ack = True
+        self.running = False
+        self.packet_size = 4096
+        self._replies: queue.Queue[bytes | None] = queue.Queue()
+        self._last: bytes = b""
+        self._send_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_loop, name="rsp-reader", daemon=True)
+        self._reader.start()
+
+    def _read_loop(self) -> None:
+        buffer = bytearray()
+        try:
+            while True:
+                data = self.sock.recv(65536)
+                if not data:
+                    break
+                buffer += data
+                while buffer:
+                    if buffer[0] in b"+":
+                        del buffer[0]
+                    elif buffer[0] in b"-":
+                        # the stub wants the last packet again
+                        del buffer[0]
+                        with self._send_lock:
+                            self.sock.sendall(self._last)
+                    elif buffer[0] in b"$":
+                        end = buffer.find(b"#")
+                        if end < 0 or len(buffer) < end + 3:
+                            break
+                        data, checksum = bytes(buffer[1:end]), bytes(buffer[end + 1 : end + 3])
+                        del buffer[: end + 3]
+                        if self.ack:
+                            with self._send_lock:
+                                self.sock.sendall(b"+" if _checksum(data) == checksum.lower() else b"-")
+                        self._deliver(_decode(data))
+                    else:
+                        del buffer[0]
+        except OSError:
+            pass
+        finally:
+            self._replies.put(None)
+
+    def _deliver(self, packet: bytes) -> None:
+        if self.running and packet[:1] in (b"T", b"S", b"W", b"X"):
+            self.running = False
+            self.on_stop(packet)
+        elif self.running and packet[:1] == b"O":
+            self.log.debug("Target output: %s", bytes.fromhex(packet[1:].decode()).decode(errors="replace"))
+        else:
+            self._replies.put(packet)
+
+    def send(self, data: bytes) -> None:
+        packet = b"$" + data + b"#" + _checksum(data)
+        with self._send_lock:
+            self._last = packet
+            self.sock.sendall(packet)
+
+    def request(self, data: bytes, timeout: float = config.wait_timeout) -> bytes:
+        """
+        Send a packet and return the stub's reply.
+        """
+        self.send(data)
+        try:
+            reply = self._replies.get(timeout=timeout)
+        except queue.Empty:
+            raise TimeoutError(f"Timeout waiting for the gdbstub to answer {data[:32]!r}") from None
+        if reply is None:
+            self._replies.put(None)
+            raise EOFError("gdbstub closed the connection")
+        return reply
+
+    def resume(self, data: bytes) -> None:
+        """
+        Send c or s without waiting; the stop reply goes to on_stop.
+        """
+        self.running = True
+        self.send(data)
+
+    def interrupt(self) -> None:
+        with self._send_lock:
+            self.sock.sendall(b"\x03")
+
+    def close(self) -> None:
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self._reader.join(timeout=config.wait_timeout)
+
+
+class RspSession(GdbSession):
+    """
+    A GdbSession that speaks the remote protocol to QEMU itself.
+    Commands are carried out one at a time, and like GDB in all-stop mode a
+    command sent while the target runs waits until it has stopped.
+    """
+
+    def __init__(self, log):
+        self._init_state(log)
+        self.conn: RspConnection | None = None
+        # of the file given to -file-exec-and-symbols
+        self.symbols: symbols.SymbolIndex | None = None
+        # number -> breakpoint as -break-list shows it, plus its "address"
+        self.breakpoints: dict[str, dict] = {}
+        self._numbers = itertools.count(1)
+        # (name, RSP register number, bits)
+        self.target_registers: list[tuple[str, int, int]] | None = None
+        # (address, stop reason) of the internal breakpoint -exec-finish or a -exec-next-instruction
+        # over a call runs to
+        self._until: tuple[int, str] | None = None
+        # the packet the target was last resumed with
+        self._resumed_with = b""
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._handlers = {
+            "-target-select": self._target_select,
+            "-target-disconnect": self._target_disconnect,
+            "-file-exec-and-symbols": self._file_exec_and_symbols,
+            "-break-insert": self._break_insert,
+            "-break-delete": self._break_delete,
+            "-break-disable": lambda args: self._break_enable(args, False),
+            "-break-enable": lambda args: self._break_enable(args, True),
+            "-break-list": self._break_list,
+            "-exec-continue": self._exec_continue,
+            "-exec-step-instruction": self._exec_step_instruction,
+            "-exec-next-instruction": self._exec_next_instruction,
+            "-exec-finish": self._exec_finish,
+            "-exec-interrupt": self._exec_interrupt,
+            "-data-list-register-names": self._data_list_register_names,
+            "-data-list-register-values": self._data_list_register_values,
+            "-data-read-memory-bytes": self._data_read_memory_bytes,
+            "-data-evaluate-expression": self._data_evaluate_expression,
+            "-stack-list-frames": self._stack_list_frames,
+        }
+
+    def submit(self, command: str) -> Future:
+        future = Future()
+        name, _, args = command.partition(" ")
+        if name != "-exec-interrupt" and not self._idle.wait(config.wait_timeout):
+            raise TimeoutError(f"Timeout waiting for the target to stop before '{command}'")
+        with self._lock:
+            if self._closed:
+                raise EOFError("gdbstub connection closed")
+            if self._resumes(command):
+                with self._cond:
+                    self._drop_stale_stops()
+            token = next(self._tokens)
+            handler = self._handlers.get(name)
+            try:
+                if handler is None:
+                    raise RspError(f"{name} is not supported without GDB")
+                message, payload = handler(args.strip())
+            except (RspError, ValueError, IndexError) as e:
+                # malformed arguments end up here as well
+                message, payload = "error", {"msg": str(e)}
+            except (OSError, EOFError, TimeoutError) as e:
+                future.set_exception(e)
+                return future
+        future.set_result(Response([ResultRecord("result", message, payload, token, f"{token}^{message}")]))
+        return future
+
+    def exit(self) -> None:
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+        self._close(EOFError("gdbstub connection closed"))
+        self._idle.set()
+
+    def _connection(self) -> RspConnection:
+        if self.conn is None:
+            raise RspError("The program is not being run.")
+        return self.conn
+
+    def _event(self, message: str, payload: dict) -> None:
+        self._dispatch(AsyncRecord("notify", message, payload, None, f"*{message}"))
+
+    # --- target and symbols ---
+
+    def _target_select(self, args: str):
+        _, _, target = args.partition(" ")
+        if self.conn is not None:
+            self.conn.close()
+        self.conn = RspConnection(target.strip(), self._on_stop, self.log)
+        supported = self.conn.request(b"qSupported:xmlRegisters=riscv").decode()
+        for feature in supported.split(";"):
+            if feature.startswith("PacketSize="):
+                self.conn.packet_size = int(feature.partition("=")[2], 16)
+        if "QStartNoAckMode+" in supported and self.conn.request(b"QStartNoAckMode") == b"OK":
+            self.conn.ack = False
+        # the stub reports why the target is halted, nothing else to do with it
+        self.conn.request(b"?")
+        self.target_registers = None
+        self.breakpoints.clear()
+        return "connected", None
+
+    def _target_disconnect(self, args: str):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        return "done", None
+
+    def _file_exec_and_symbols(self, args: str):
+        path = shlex.split(args)[0] if args else ""
+        self.symbols = None
+        if path:
+            try:
+                self.symbols = symbols.index(path)
+            except (OSError, ValueError, struct.error) as e:
+                raise RspError(f"{path}: {e}") from None
+        return "done", None
+
+    def _function_at(self, address: int) -> str | None:
+        symbol = self.symbols.symbolize(address) if self.symbols is not None else None
+        # functions and assembly labels, which is what GDB names frames after without debug info
+        return symbol.name if symbol is not None and symbol.type != elf.STT_OBJECT else None
+
+    def _symbol(self, name: str) -> symbols.Symbol:
+        symbol = self.symbols.lookup(name) if self.symbols is not None else None
+        if symbol is None:
+            raise RspError(f'No symbol "{name}" in the ELF symbol table.')
+        return symbol
+
+    def _address(self, expr: str) -> int:
+        """
+        Value of a location or expression that is a number, a symbol or &symbol.
+        """
+        expr = expr.strip().lstrip("*&").strip()
+        try:
+            return int(expr, 0)
+        except ValueError:
+            pass
+        return self._symbol(expr).address
+
+    def _frame(self, pc: int) -> dict:
+        return {"addr": f"0x{pc:016x}", "func": self._function_at(pc) or "??", "args": []}
+
+    # --- registers and memory ---
+
+    def _registers(self) -> list[tuple[str, int, int]]:
+        if self.target_registers is None:
+            registers = []
+            try:
+                self._read_features("target.xml", registers, [0])
+            except RspError:
+                registers = []
+            if not registers:
+                registers = [(name, i, 64) for i, name in enumerate(_FALLBACK_REGISTERS)]
+            self.target_registers = registers
+        return self.target_registers
+
+    def _read_features(self, annex: str, registers: list, next_regnum: list[int]) -> None:
+        data = b""
+        while True:
+            length = self._connection().packet_size - 8
+            reply = self._connection().request(b"qXfer:features:read:%s:%x,%x" % (annex.encode(), len(data), length))
+            if not reply or reply[:1] not in (b"m", b"l"):
+                raise RspError(f"Cannot read {annex}")
+            data += reply[1:]
+            if reply[:1] == b"l":
+                break
+        for el in ET.fromstring(data).iter():
+            tag = el.tag.rpartition("}")[2]
+            if tag == "include":
+                self._read_features(el.get("href"), registers, next_regnum)
+            elif tag == "reg":
+                if el.get("regnum") is not None:
+                    next_regnum[0] = int(el.get("regnum"))
+                registers.append((el.get("name"), next_regnum[0], int(el.get("bitsize", "64"))))
+                next_regnum[0] += 1
+
+    def _read_register(self, regnum: int) -> int | None:
+        reply = self._connection().request(b"p%x" % regnum)
+        if not reply or reply[:1] == b"E" or b"x" in reply:
+            return None
+        return int.from_bytes(bytes.fromhex(reply.decode()), "little")
+
+    def _regnum(self, name: str) -> int:
+        for reg, regnum, _ in self._registers():
+            if reg == name:
+                return regnum
+        raise RspError(f"Invalid register `{name}'")
+
+    def _pc(self) -> int:
+        pc = self._read_register(self._regnum("pc"))
+        if pc is None:
+            raise RspError("Cannot read pc")
+        return pc
+
+    def _data_list_register_names(self, args: str):
+        registers = self._registers()
+        names = [""] * (max(regnum for _, regnum, _ in registers) + 1)
+        for name, regnum, _ in registers:
+            names[regnum] = name
+        return "done", {"register-names": names}
+
+    def _data_list_register_values(self, args: str):
+        fmt, *numbers = args.split()
+        regnums = [int(n) for n in numbers if not n.startswith("-")] or [r for _, r, _ in self._registers()]
+        values = []
+        for regnum in regnums:
+            value = self._read_register(regnum)
+            if value is None:
+                continue
+            text = str(value) if fmt in ("d", "u") else hex(value)
+            values.append({"number": str(regnum), "value": text})
+        return "done", {"register-values": values}
+
+    def _read_memory(self, address: int, size: int) -> bytes:
+        data = bytearray()
+        chunk = (self._connection().packet_size - 4) // 2
+        while len(data) < size:
+            n = min(chunk, size - len(data))
+            reply = self._connection().request(b"m%x,%x" % (address + len(data), n))
+            if not reply or reply[:1] == b"E":
+                if not data:
+                    raise RspError(f"Unable to read memory at 0x{address:x}.")
+                break
+            data += bytes.fromhex(reply.decode())
+        return bytes(data)
+
+    def _data_read_memory_bytes(self, args: str):
+        words = shlex.split(args)
+        offset = 0
+        if words[0] == "-o":
+            offset = int(words[1], 0)
+            words = words[2:]
+        address = self._address(words[0]) + offset
+        data = self._read_memory(address, int(words[1], 0))
+        block = {
+            "begin": f"0x{address:016x}",
+            "offset": "0x0000000000000000",
+            "end": f"0x{address + len(data):016x}",
+            "contents": data.hex(),
+        }
+        return "done", {"memory": [block]}
+
+    def _data_evaluate_expression(self, args: str):
+        expr = args.strip().strip('"').strip()
+        if expr.startswith("$"):
+            value = self._read_register(self._regnum(expr[1:]))
+            if value is None:
+                raise RspError(f"Cannot read {expr}")
+            return "done", {"value": str(value)}
+        if expr.startswith("&"):
+            address = self._address(expr)
+            name = expr[1:].strip()
+            return "done", {"value": f"0x{address:x} <{name}>"}
+        try:
+            return "done", {"value": str(int(expr, 0))}
+        except ValueError:
+            pass
+        symbol = self._symbol(expr)
+        if symbol.type == elf.STT_FUNC:
+            return "done", {"value": f"{{<text variable, no debug info>}} 0x{symbol.address:x} <{expr}>"}
+        if symbol.size not in (1, 2, 4, 8):
+            raise RspError(f"'{expr}' has unknown type; only scalars can be read without debug info")
+        value = int.from_bytes(self._read_memory(symbol.address, symbol.size), "little")
+        return "done", {"value": str(value)}
+
+    def _stack_list_frames(self, args: str):
+        frame = dict(self._frame(self._pc()), level="0")
+        return "done", {"stack": [frame]}
+
+    # --- breakpoints ---
+
+    def _insert(self, bp: dict) -> None:
+        kind = b"1" if bp["type"] == "hw breakpoint" else b"0"
+        reply = self._connection().request(b"Z%s,%x,4" % (kind, bp["address"]))
+        if reply != b"OK":
+            raise RspError(f"Cannot insert breakpoint {bp['number']} at 0x{bp['address']:x}")
+
+    def _remove(self, bp: dict) -> None:
+        kind = b"1" if bp["type"] == "hw breakpoint" else b"0"
+        self._connection().request(b"z%s,%x,4" % (kind, bp["address"]))
+
+    def _break_insert(self, args: str):
+        words = shlex.split(args)
+        temporary = hardware = disabled = False
+        while words and words[0].startswith("-"):
+            flag = words.pop(0)
+            if flag == "-t":
+                temporary = True
+            elif flag == "-h":
+                hardware = True
+            elif flag == "-d":
+                disabled = True
+            elif flag in ("-f", "--qualified"):
+                pass
+            else:
+                raise RspError(f"-break-insert {flag} is not supported without GDB")
+        if len(words) != 1:
+            raise RspError(f"Unsupported location: {args}")
+        location = words[0]
+        address = self._address(location)
+        number = str(next(self._numbers))
+        bp = {
+            "number": number,
+            "type": "hw breakpoint" if hardware else "breakpoint",
+            "disp": "del" if temporary else "keep",
+            "enabled": "n" if disabled else "y",
+            "addr": f"0x{address:016x}",
+            "func": self._function_at(address) or "??",
+            "times": "0",
+            "original-location": location,
+            "address": address,
+        }
+        if not disabled:
+            self._insert(bp)
+        self.breakpoints[number] = bp
+        return "done", {"bkpt": self._shown(bp)}
+
+    @staticmethod
+    def _shown(bp: dict) -> dict:
+        return {k: v for k, v in bp.items() if k != "address"}
+
+    def _break_delete(self, args: str):
+        for number in args.split():
+            bp = self.breakpoints.pop(number, None)
+            if bp is not None and bp["enabled"] == "y":
+                self._remove(bp)
+        return "done", None
+
+    def _break_enable(self, args: str, enabled: bool):
+        for number in args.split():
+            bp = self.breakpoints.get(number)
+            if bp is None or (bp["enabled"] == "y") == enabled:
+                continue
+            if enabled:
+                self._insert(bp)
+            else:
+                self._remove(bp)
+            bp["enabled"] = "y" if enabled else "n"
+        return "done", None
+
+    def _break_list(self, args: str):
+        body = [self._shown(bp) for bp in self.breakpoints.values()]
+        return "done", {"BreakpointTable": {"nr_rows": str(len(body)), "nr_cols": "6", "hdr": [], "body": body}}
+
+    # --- execution ---
+
+    def _step_over_breakpoint(self) -> None:
+        # like GDB, lift a breakpoint at pc for one instruction, or the target would stop on it again
+        pc = self._pc()
+        here = [bp for bp in self.breakpoints.values() if bp["address"] == pc and bp["enabled"] == "y"]
+        if not here:
+            return
+        for bp in here:
+            self._remove(bp)
+        try:
+            self._connection().request(b"s")
+        finally:
+            for bp in here:
+                self._insert(bp)
+
+    def _resume(self, packet: bytes):
+        conn = self._connection()
+        self._idle.clear()
+        self._event("running", {"thread-id": "all"})
+        self._resumed_with = packet
+        conn.resume(packet)
+        return "running", None
+
+    def _exec_continue(self, args: str):
+        self._step_over_breakpoint()
+        return self._resume(b"c")
+
+    def _exec_step_instruction(self, args: str):
+        return self._resume(b"s")
+
+    def _call_length(self, pc: int) -> int | None:
+        """
+        Length of the instruction at pc if it is a call (jal or jalr linking ra or t0, or c.jalr), else None.
+        """
+        half = int.from_bytes(self._read_memory(pc, 2), "little")
+        if half & 0b11 != 0b11:
+            # c.jalr rs1: funct4 1001, rs1 != 0, rs2 0, op 10 (c.jal is RV32 only)
+            return 2 if half & 0xF07F == 0x9002 and (half >> 7) & 0x1F else None
+        insn = int.from_bytes(self._read_memory(pc, 4), "little")
+        if insn & 0x7F in (0x6F, 0x67) and (insn >> 7) & 0x1F in (1, 5):
+            return 4
+        return None
+
+    def _run_until(self, address: int, reason: str):
+        self._step_over_breakpoint()
+        if self._connection().request(b"Z0,%x,4" % address) != b"OK":
+            raise RspError(f"Cannot insert breakpoint at 0x{address:x}")
+        self._until = (address, reason)
+        return self._resume(b"c")
+
+    def _exec_next_instruction(self, args: str):
+        pc = self._pc()
+        length = self._call_length(pc)
+        if length is None:
+            return self._exec_step_instruction(args)
+        # step over the call by running to the instruction after it
+        return self._run_until(pc + length, "end-stepping-range")
+
+    def _exec_finish(self, args: str):
+        ra = self._read_register(self._regnum("ra"))
+        if ra is None:
+            raise RspError("Cannot read ra")
+        return self._run_until(ra, "function-finished")
+
+    def _exec_interrupt(self, args: str):
+        if self.conn is not None and self.conn.running:
+            self.conn.interrupt()
+        return "done", None
+
+    def _on_stop(self, packet: bytes) -> None:
+        # on the reader thread, which must not wait for replies itself
+        threading.Thread(target=self._stopped, args=(packet,), name="rsp-stop", daemon=True).start()
+
+    def _stopped(self, packet: bytes) -> None:
+        try:
+            with self._lock:
+                self._event("stopped", self._stop_payload(packet))
+        except (RspError, OSError, EOFError, TimeoutError) as e:
+            self.log.exception("Failed to handle stop reply %r", packet)
+            self._event("stopped", {"reason": "signal-received", "signal-name": "SIGTRAP", "error": str(e)})
+        finally:
+            self._idle.set()
+
+    def _stop_payload(self, packet: bytes) -> dict:
+        if packet[:1] == b"W":
+            return {"reason": "exited-normally"}
+        if packet[:1] == b"X":
+            return {"reason": "exited-signalled", "signal-name": _SIGNALS.get(int(packet[1:3], 16), "SIGKILL")}
+        signal = int(packet[1:3], 16)
+        pc = self._pc()
+        payload = {"frame": self._frame(pc), "thread-id": "1", "stopped-threads": "all"}
+        until, self._until = self._until, None
+        if until is not None:
+            self._connection().request(b"z0,%x,4" % until[0])
+        hit = [bp for bp in self.breakpoints.values() if bp["address"] == pc and bp["enabled"] == "y"]
+        if signal == SIGTRAP and hit:
+            bp = hit[0]
+            bp["times"] = str(int(bp["times"]) + 1)
+            if bp["disp"] == "del":
+                self._remove(bp)
+                del self.breakpoints[bp["number"]]
+            return {"reason": "breakpoint-hit", "disp": bp["disp"], "bkptno": bp["number"], **payload}
+        if signal == SIGTRAP and until is not None and until[0] == pc:
+            return {"reason": until[1], **payload}
+        if signal == SIGTRAP and self._resumed_with == b"s":
+            return {"reason": "end-stepping-range", **payload}
+        name = _SIGNALS.get(signal, f"SIG{signal}")
+        return {"reason": "signal-received", "signal-name": name, **payload}
@@ -0,0 +1,161 @@
+"""
+Parallel test runner.
+
+Every test case runs in a worker process of its own pool slot with a private
+QEMU, gdbstub socket and output directory, so tests do not share any host
+resources and can run side by side. The tests of a SharedQemuGdbTest class
+share one machine and go to one worker together, in order.
+"""
+
+import dataclasses
+import sys
+import time
+import traceback
+import unittest
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from . import timing
+from .config import config
+from .testcase import SharedQemuGdbTest
+
+
+def _flatten(suite: unittest.TestSuite) -> list[unittest.TestCase]:
+    tests = []
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            tests.extend(_flatten(test))
+        else:
+            tests.append(test)
+    return tests
+
+
+class _Result(unittest.TestResult):
+    """
+    Collects a picklable outcome per test, so the tests of a class run in one worker are reported one by one.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.outcomes: dict[str, dict] = {}
+        self._start = 0.0
+
+    def outcome(self, test) -> dict:
+        # class and module fixture errors arrive for tests that never started
+        return self.outcomes.setdefault(
+            test.id(), {"id": test.id(), "duration": 0.0, "failures": [], "errors": [], "skipped": []}
+        )
+
+    def startTest(self, test):
+        super().startTest(test)
+        self.outcome(test)
+        self._start = time.monotonic()
+
+    def stopTest(self, test):
+        super().stopTest(test)
+        self.outcome(test)["duration"] = time.monotonic() - self._start
+
+    def addError(self, test, err):
+        super().addError(test, err)
+        self.outcome(test)["errors"].append(self.errors[-1][1])
+
+    def addFailure(self, test, err):
+        super().addFailure(test, err)
+        self.outcome(test)["failures"].append(self.failures[-1][1])
+
+    def addSkip(self, test, reason):
+        super().addSkip(test, reason)
+        self.outcome(test)["skipped"].append(reason)
+
+    def addSubTest(self, test, subtest, err):
+        super().addSubTest(test, subtest, err)
+        if err is not None:
+            kind = "failures" if issubclass(err[0], test.failureException) else "errors"
+            self.outcome(test)[kind].append(getattr(self, kind)[-1][1])
+
+
+def _run_test(test_ids: list[str], overrides: dict) -> dict:
+    """
+    Worker entry: run tests by id, in order, and return picklable summaries of their outcomes.
+    Tests of one class run in the same suite, so its class fixture is set up once.
+    """
+    for name, value in overrides.items():
+        setattr(config, name, value)
+    suite = unittest.defaultTestLoader.loadTestsFromNames(test_ids)
+    result = _Result()
+    suite.run(result)
+    return {"outcomes": list(result.outcomes.values()), "timing": timing.take()}
+
+
+def _units(tests: list[unittest.TestCase]) -> list[list[str]]:
+    """
+    Test ids to hand to workers together: each test on its own, except that the selected
+    tests of a SharedQemuGdbTest class go together.
+    """
+    units: dict[str, list[str]] = {}
+    for test in tests:
+        if isinstance(test, SharedQemuGdbTest):
+            key = f"{type(test).__module__}.{type(test).__qualname__}"
+        else:
+            key = test.id()
+        units.setdefault(key, []).append(test.id())
+    return list(units.values())
+
+
+def run_parallel(suite: unittest.TestSuite, jobs: int, stream=sys.stderr) -> bool:
+    """
+    Run the tests of suite in a pool of jobs processes.
+    Reports in the style of unittest.TextTestRunner and returns True if everything passed.
+    """
+    units = _units(_flatten(suite))
+    overrides = dataclasses.asdict(config)
+    overrides["qemu_gdbstub_port"] = "auto"
+    overrides["per_test_outputdir"] = True
+
+    start = time.monotonic()
+    outcomes = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(_run_test, unit, overrides): unit for unit in units}
+        for future in as_completed(futures):
+            try:
+                done = future.result()
+            except Exception:
+                done = {
+                    "outcomes": [
+                        {
+                            "id": ", ".join(futures[future]),
+                            "duration": 0.0,
+                            "failures": [],
+                            "errors": [traceback.format_exc()],
+                            "skipped": [],
+                        }
+                    ],
+                    "timing": [],
+                }
+            timing.records.extend(done["timing"])
+            for outcome in done["outcomes"]:
+                outcomes.append(outcome)
+                if outcome["errors"]:
+                    status = "ERROR"
+                elif outcome["failures"]:
+                    status = "FAIL"
+                elif outcome["skipped"]:
+                    status = f"skipped {outcome['skipped'][0]!r}"
+                else:
+                    status = "ok"
+                stream.write(f"{outcome['id']} ... {status} ({outcome['duration']:.1f}s)\n")
+            stream.flush()
+
+    failures = errors = 0
+    for outcome in sorted(outcomes, key=lambda o: o["id"]):
+        for kind, tracebacks in (("ERROR", outcome["errors"]), ("FAIL", outcome["failures"])):
+            for tb in tracebacks:
+                stream.write("\n" + "=" * 70 + f"\n{kind}: {outcome['id']}\n" + "-" * 70 + f"\n{tb}")
+        failures += len(outcome["failures"])
+        errors += len(outcome["errors"])
+
+    stream.write("\n" + "-" * 70 + f"\nRan {len(outcomes)} tests in {time.monotonic() - start:.3f}s\n\n")
+    if failures or errors:
+        stream.write(f"FAILED (failures={failures}, errors={errors})\n")
+    else:
+        stream.write("OK\n")
+    return not (failures or errors)
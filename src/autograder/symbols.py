@@ -0,0 +1,202 @@
+"""
+ELF Symbol Index
+
+Function, object and assembly label symbols of vmlinux, for resolving names and decoding
+addresses without asking GDB. The index is two sorted arrays for address
+lookups by bisection and a dict for name lookups. It is built once per kernel
+build from the mapped ELF file and kept on disk under the build-id, so later
+runs load it with a single marshal read.
+"""
+
+import bisect
+import marshal
+import os
+import tempfile
+from array import array
+from dataclasses import dataclass
+
+from . import cache, elf
+from .config import config
+
+# bumped when the layout of the on-disk index changes
+_VERSION = 2
+
+
+@dataclass
+class Symbol:
+    name: str
+    address: int
+    size: int
+    # elf.STT_FUNC, elf.STT_OBJECT or elf.STT_NOTYPE (an assembly label)
+    type: int
+
+    def contains(self, address: int) -> bool:
+        return self.address <= address < self.address + max(self.size, 1)
+
+
+class SymbolIndex:
+    def __init__(self, addresses: array, sizes: array, types: bytes, names: list[str], binds: bytes):
+        # sorted by address
+        self.addresses = addresses
+        self.sizes = sizes
+        self.types = types
+        self.names = names
+        # name -> position, global symbols winning over local ones of the same name
+        self.by_name: dict[str, int] = {}
+        for i, name in enumerate(names):
+            j = self.by_name.setdefault(name, i)
+            if j != i and binds[i] == elf.STB_GLOBAL and binds[j] != elf.STB_GLOBAL:
+                self.by_name[name] = i
+        self.binds = binds
+        # max_ends[i] is the furthest any of the first i + 1 symbols reaches, which bounds the look-back in symbolize
+        self.max_ends = array("Q")
+        end = 0
+        for start, size in zip(addresses, sizes, strict=True):
+            end = max(end, start + max(size, 1))
+            self.max_ends.append(end)
+
+    @classmethod
+    def from_elf(cls, path: str) -> "SymbolIndex":
+        entries = sorted(elf.symbols(path), key=lambda s: (s[1], s[0]))
+        return cls(
+            array("Q", (e[1] for e in entries)),
+            array("Q", (e[2] for e in entries)),
+            bytes(e[3] for e in entries),
+            [e[0] for e in entries],
+            bytes(e[4] for e in entries),
+        )
+
+    def dumps(self) -> bytes:
+        return marshal.dumps(
+            (_VERSION, self.addresses.tobytes(), self.sizes.tobytes(), self.types, self.names, self.binds)
+        )
+
+    @classmethod
+    def loads(cls, data: bytes) -> "SymbolIndex | None":
+        try:
+            version, addresses, sizes, types, names, binds = marshal.loads(data)
+        except (EOFError, ValueError, TypeError):
+            return None
+        if version != _VERSION:
+            return None
+        return cls(array("Q", addresses), array("Q", sizes), types, names, binds)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _symbol(self, i: int) -> Symbol:
+        return Symbol(self.names[i], self.addresses[i], self.sizes[i], self.types[i])
+
+    def lookup(self, name: str) -> Symbol | None:
+        i = self.by_name.get(name)
+        return self._symbol(i) if i is not None else None
+
+    def address(self, name: str) -> int:
+        """
+        Address of the symbol name. Raises KeyError if there is none.
+        """
+        i = self.by_name.get(name)
+        if i is None:
+            raise KeyError(f"No symbol {name} in the ELF symbol table")
+        return self.addresses[i]
+
+    def symbolize(self, address: int) -> Symbol | None:
+        """
+        The symbol address falls into, preferring functions, or None if it is in none.
+        Assembly labels have no size, so code after one that no sized symbol covers belongs to it.
+        """
+        i = bisect.bisect_right(self.addresses, address)
+        if i > 0 and self.types[i - 1] == elf.STT_NOTYPE:
+            label = i - 1
+        else:
+            label = None
+        found = None
+        # symbols nest and overlap (aliases, labels inside functions), so look back until none before can reach address
+        while i > 0 and self.max_ends[i - 1] > address:
+            i -= 1
+            if address < self.addresses[i] + max(self.sizes[i], 1):
+                if self.types[i] == elf.STT_FUNC:
+                    found = i
+                    break
+                if found is None:
+                    found = i
+        if found is None:
+            found = label
+        return self._symbol(found) if found is not None else None
+
+    def describe(self, address: int) -> str:
+        """
+        address as GDB prints it in a frame, e.g. "printk+16", or in hex if no symbol covers it.
+        """
+        symbol = self.symbolize(address)
+        if symbol is None:
+            return f"0x{address:x}"
+        offset = address - symbol.address
+        return f"{symbol.name}+{offset}" if offset else symbol.name
+
+
+def _cache_path(path: str) -> str | None:
+    if not config.cache_dir:
+        return None
+    key = elf.build_id(path) or cache.file_key(path)
+    if key is None:
+        return None
+    return os.path.join(config.cache_dir, "symbols", f"{key.replace('/', '_').replace(':', '_')}.marshal")
+
+
+def load(path: str) -> SymbolIndex:
+    """
+    Build the index of the ELF file at path, or load it from the on-disk cache.
+    """
+    cached = _cache_path(path)
+    if cached is not None:
+        try:
+            with open(cached, "rb") as f:
+                index = SymbolIndex.loads(f.read())
+            if index is not None:
+                return index
+        except OSError:
+            pass
+    index = SymbolIndex.from_elf(path)
+    if cached is not None:
+        try:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(cached), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(index.dumps())
+            os.replace(tmp, cached)
+        except OSError:
+            pass
+    return index
+
+
+# (path, file key) -> index, so a changed vmlinux is picked up
+_indexes: dict[tuple[str, str | None], SymbolIndex] = {}
+
+
+def index(path: str | None = None) -> SymbolIndex:
+    """
+    The symbol index of path, config.vmlinux_path by default, loaded once per process.
+    """
+    path = path or config.vmlinux_path
+    key = (path, cache.file_key(path))
+    found = _indexes.get(key)
+    if found is None:
+        found = load(path)
+        _indexes[key] = found
+    return found
+
+
+def address(name: str) -> int:
+    """
+    Address of the kernel symbol name.
+    """
+    return index().address(name)
+
+
+def symbolize(address: int) -> Symbol | None:
+    return index().symbolize(address)
+
+
+def describe(address: int) -> str:
+    return index().describe(address)
@@ -1,34 +1,67 @@
 # This implementation is based on QemuBaseTest from the QEMU project.
 # Original code by https://gitlab.com/qemu-project/qemu, adapted for ZJU-OS testing.
+import asyncio
+import functools
+import hashlib
+import json
 import logging
 import os
+import shutil
+import tempfile
+import time
 import unittest
 import uuid
 from pathlib import Path
 
-from pygdbmi.gdbcontroller import GdbController
-from qemu.machine import QEMUMachine
-
-from . import gdb
+from . import aio, cache, elf, gdb, machine, pool, rsp, timing
 from .config import config
 from .qemu import console, monitor
+from .wait import FatalFailure
+
+
+def _arg_files(args: list[str]) -> list[str]:
+    """
+    Files named by QEMU arguments, on their own (-kernel Image) or as file= in an option string (-drive file=...,).
+    """
+    files = []
+    for arg in args:
+        if os.path.isfile(arg):
+            files.append(arg)
+            continue
+        for option in arg.split(","):
+            name, _, value = option.partition("=")
+            if name == "file" and os.path.isfile(value):
+                files.append(value)
+    return files
 
 
 class QemuGdbTest(unittest.TestCase):
     def log_file(self, *args):
         return str(Path(self.outputdir, *args))
 
-    # def socket_dir(self):
-    #     if self.socketdir is None:
-    #         self.socketdir = tempfile.TemporaryDirectory(prefix="qemu_func_test_sock_")
-    #     return self.socketdir
+    def socket_dir(self):
+        # 放在 /tmp 下，避免 UNIX socket 路径超长
+        if self.socketdir is None:
+            self.socketdir = tempfile.mkdtemp(prefix="qemu_func_test_sock_")
+        return self.socketdir
+
+    def gdbstub(self) -> tuple[list[str], str]:
+        """
+        QEMU arguments for the gdbstub and the matching GDB remote target.
+        With qemu_gdbstub_port "auto" every test gets a private UNIX socket.
+        """
+        return machine.gdbstub(self.socket_dir(), config.qemu_gdbstub_port)
 
     def setUp(self):
         self.qemu_bin = config.qemu_bin
         self.assertIsNotNone(self.qemu_bin, "qemu_bin must be set")
         self.arch = self.qemu_bin.split("-")[-1]
-        # self.socketdir = None # 用于给虚拟机输入
+        self.socketdir = None
+        self.pooled = None
+        self.console_recorder = None
         self.outputdir = config.outputdir
+        if config.per_test_outputdir:
+            self.outputdir = os.path.join(config.outputdir, self.id())
         self.workdir = os.path.join(self.outputdir, "scratch")
         os.makedirs(self.workdir, exist_ok=True)
 
@@ -42,14 +75,87 @@ class QemuGdbTest(unittest.TestCase):
         self.log.addHandler(self._log_fh)
 
         try:
-            self.launch_vm()
-            self.launch_gdb()
-            self.run_to_kernel()
+            if config.pool_size > 0:
+                self.checkout_from_pool()
+            elif config.boot_snapshot:
+                self.boot_from_snapshot()
+            else:
+                self.launch_vm()
+                self.launch_gdb()
+                self.run_to_kernel()
         except Exception as e:
             self.tearDown()
             raise e
 
-    def launch_vm(self):
+    def checkout_from_pool(self):
+        """
+        Take a halted machine and a symbol-loaded GDB from the warm pool instead of launching them.
+        """
+        with timing.span(self, "phase", "pool_checkout"):
+            p = pool.get_pool()
+            self.attach_vm_logs()
+            vm_entry = p.checkout_vm()
+            self.vm = vm_entry.vm
+            # filled from the pooled machine's log when it goes back
+            self.console_log_name = self.log_file("console.log")
+            self.attach_gdb_logs()
+            gdb_entry = p.checkout_gdb()
+            self.gdb = gdb_entry.session
+            self.pooled = (vm_entry, gdb_entry)
+        self.record_console()
+        monitor.query_version(self)
+
+        with timing.span(self, "phase", "load_symbols"):
+            symbols = gdb_entry.symbols.result(config.wait_timeout)
+        if not gdb.check_responses(symbols, message="done"):
+            raise Exception("Failed to load executable and symbols")
+        self.connect_gdb(vm_entry.gdb_target, load_symbols=False)
+        self.run_to_kernel()
+
+    def boot_snapshot_path(self) -> str:
+        """
+        Where the machine state at the kernel entry is kept.
+        Keyed by everything that changes it: QEMU binary, QEMU arguments and the files they name.
+        """
+        key = [cache.file_key(self.qemu_bin), config.qemu_args]
+        key += [cache.file_key(path) for path in _arg_files(config.qemu_args)]
+        digest = hashlib.sha256(json.dumps(key).encode()).hexdigest()
+        return os.path.join(config.cache_dir or self.workdir, "boot-snapshots", f"{digest}.mig")
+
+    def boot_from_snapshot(self):
+        """
+        Start from a saved machine state that is already stopped at the kernel entry.
+        The first test to run without one boots normally and saves it on the way.
+        """
+        path = self.boot_snapshot_path()
+        if not os.path.exists(path):
+            self.launch_vm()
+            self.launch_gdb()
+            self.run_to_kernel()
+            self.save_boot_snapshot(path)
+            # 迁移完成后源虚拟机不能继续运行，换一台从快照启动的
+            self.shutdown_gdb()
+            self.shutdown_vm()
+        self.launch_vm(incoming=path)
+        self.launch_gdb()
+
+    def save_boot_snapshot(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{uuid.uuid4()}.tmp"
+        with timing.span(self, "phase", "save_boot_snapshot"):
+            monitor.migrate(self, f"file:{tmp}")
+            deadline = time.monotonic() + config.wait_timeout
+            while True:
+                status = monitor.query_migrate(self).get("return", {}).get("status")
+                if status == "completed":
+                    break
+                if status in ("failed", "cancelled") or time.monotonic() > deadline:
+                    raise Exception(f"Failed to save boot snapshot, migration {status}")
+                time.sleep(config.frequency)
+        os.replace(tmp, path)
+        self.log.debug("Boot snapshot saved to %s", path)
+
+    def attach_vm_logs(self):
         # QEMU Machine 日志
         self.machinelog = logging.getLogger("qemu.machine")
         self.machinelog.setLevel(logging.DEBUG)
@@ -58,6 +164,19 @@ class QemuGdbTest(unittest.TestCase):
         self.qmplog.setLevel(logging.DEBUG)
         self.qmplog.addHandler(self._log_fh)
 
+    def attach_gdb_logs(self):
+        # GDB 日志
+        self.gdb_log_name = self.log_file("gdb.log")
+        self.gdb_log = logging.getLogger("gdb")
+        self.gdb_log.setLevel(logging.DEBUG)
+        self._gdb_log_fh = logging.FileHandler(self.gdb_log_name, mode="w")
+        self._gdb_log_fh.setLevel(logging.DEBUG)
+        self._gdb_log_fh.setFormatter(self.fileFormatter)
+        self.gdb_log.addHandler(self._gdb_log_fh)
+
+    def launch_vm(self, incoming: str | None = None):
+        self.attach_vm_logs()
+
         # VM 控制台日志
         self.console_log_name = self.log_file("console.log")
         try:
@@ -65,81 +184,244 @@ class QemuGdbTest(unittest.TestCase):
         except FileNotFoundError:
             pass
 
-        name = str(uuid.uuid4())
-
-        self.vm = QEMUMachine(
+        self.vm = machine.new_machine(
             self.qemu_bin,
-            name=name,
-            base_temp_dir=self.workdir,
-            console_log=self.console_log_name,
+            self.workdir,
+            self.socket_dir(),
+            self.console_log_name,
+            self.gdbstub()[0],
+            incoming=incoming,
         )
-        self.vm.add_args(*config.qemu_args)
-        self.vm.set_machine("virt")
-        self.vm.set_console()
-        self.vm.set_qmp_monitor()
-        # 调试用 QMP monitor backdoor socket
-        # 可使用 qmp-shell 连接
-        # https://www.qemu.org/docs/master/devel/testing/functional.html#debugging-hung-qemu
-        # sockfile = os.path.join(self.workdir, f"qemu-backdoor-{name}.sock")
-        # self.vm.add_args(
-        #     "-chardev",
-        #     f"socket,id=backdoor,path={sockpath},server=on,wait=off",
-        #     "-mon",
-        #     "chardev=backdoor,mode=control",
-        # )
-        self.vm.launch()
+        with timing.span(self, "phase", "launch_vm"):
+            self.vm.launch()
+        self.record_console()
         monitor.query_version(self)
+        if incoming is not None:
+            # 等待快照加载完毕，之后虚拟机停在内核入口
+            with timing.span(self, "phase", "load_boot_snapshot"):
+                deadline = time.monotonic() + config.wait_timeout
+                while monitor.query_status(self).get("return", {}).get("status") == "inmigrate":
+                    if time.monotonic() > deadline:
+                        raise Exception("Timeout loading boot snapshot")
+                    time.sleep(config.frequency)
+
+    def record_console(self):
+        if config.console_record:
+            self.console_recorder = console.record_console(self, self.log_file("console.jsonl"))
+
+    def stop_recording_console(self):
+        if self.console_recorder is not None:
+            console.stop_recording_console(self)
+            self.console_recorder = None
 
     def launch_gdb(self):
-        # GDB 日志
-        self.gdb_log_name = self.log_file("gdb.log")
-        self.gdb_log = logging.getLogger("gdb")
-        self.gdb_log.setLevel(logging.DEBUG)
-        self._gdb_log_fh = logging.FileHandler(self.gdb_log_name, mode="w")
-        self._gdb_log_fh.setLevel(logging.DEBUG)
-        self._gdb_log_fh.setFormatter(self.fileFormatter)
-        self.gdb_log.addHandler(self._gdb_log_fh)
+        self.attach_gdb_logs()
 
         # 创建 GDB
-        cmd = ["gdb-multiarch", "--nx", "--quiet", "--interpreter=mi3"]
-        self.gdb = GdbController(command=cmd)
-        self.log.debug("GDB created with command: %s", " ".join(cmd))
+        with timing.span(self, "phase", "launch_gdb"):
+            self.gdb = machine.new_gdb(self.gdb_log)
+        self.log.debug("GDB created with command: %s", " ".join(self.gdb.controller.command))
+        self.connect_gdb(self.gdbstub()[1])
+
+    def connect_gdb(self, target: str, load_symbols: bool = True):
+        self.gdb.cache_key = [
+            cache.file_key(machine.GDB_COMMAND[0]),
+            elf.build_id(config.vmlinux_path) or cache.file_key(config.vmlinux_path),
+            monitor.qemu_version(self),
+        ]
 
-        if not gdb.check_responses(
-            gdb.target_select(self, "remote", f"localhost:{config.qemu_gdbstub_port}"), message="connected"
-        ):
+        with timing.span(self, "phase", "connect_gdb"):
+            connected = gdb.target_select(self, "remote", target)
+        if not gdb.check_responses(connected, message="connected"):
             raise Exception("Failed to connect to GDB stub on QEMU")
 
-        if not gdb.check_responses(gdb.file_exec_and_symbols(self, config.vmlinux_path), message="done"):
-            raise Exception("Failed to load executable and symbols")
+        if load_symbols:
+            self.log.debug("GDB index cache %s", "hit" if machine.index_cached(config.vmlinux_path) else "miss")
+            with timing.span(self, "phase", "load_symbols"):
+                symbols = gdb.file_exec_and_symbols(self, config.vmlinux_path)
+            if not gdb.check_responses(symbols, message="done"):
+                raise Exception("Failed to load executable and symbols")
 
     def run_to_kernel(self):
-        gdb.check_responses(
-            gdb.break_insert(self, gdb.locspec_address(0x80200000), temporary=True),
-            message="done",
-        )
-        stopped = gdb.check_responses(gdb.exec_continue(self), message="stopped")
-        console.wait_for_console_pattern(self, r"OpenSBI v")
-        if not stopped:
-            gdb.sync(self)
+        with timing.span(self, "phase", "run_to_kernel"):
+            gdb.check_responses(
+                gdb.break_insert(self, gdb.locspec_address(0x80200000), temporary=True),
+                message="done",
+            )
+            stopped = gdb.check_responses(gdb.exec_continue(self), message="stopped")
+            console.wait_for_console_pattern(self, r"OpenSBI v")
+            if not stopped:
+                gdb.sync(self)
 
-    def tearDown(self):
+    def shutdown_gdb(self):
         # 清理 GDB
         self.gdb.exit()
+        self.detach_gdb_logs()
+
+    def detach_gdb_logs(self):
         self.gdb_log.removeHandler(self._gdb_log_fh)
         self._gdb_log_fh.close()
 
+    def shutdown_vm(self):
         # 清理 VM
-
+        self.stop_recording_console()
         self.vm.shutdown()
         # logging.getLogger("console").removeHandler(self._console_log_fh)
         # self._console_log_fh.close()
+        self.detach_vm_logs()
+
+    def detach_vm_logs(self):
+        self.machinelog.removeHandler(self._log_fh)
+        self.qmplog.removeHandler(self._log_fh)
+
+    def tearDown(self):
+        with timing.span(self, "phase", "teardown"):
+            if self.pooled is not None:
+                # 还给池子，由池子决定复用还是销毁
+                self.stop_recording_console()
+                pool.get_pool().release(self, *self.pooled)
+                self.pooled = None
+                self.detach_gdb_logs()
+                self.detach_vm_logs()
+            else:
+                self.shutdown_gdb()
+                self.shutdown_vm()
 
         # 清理自己
 
-        # if self.socketdir is not None:
-        #     shutil.rmtree(self.socketdir.name)
-        #     self.socketdir = None
-        self.machinelog.removeHandler(self._log_fh)
+        if self.socketdir is not None:
+            shutil.rmtree(self.socketdir, ignore_errors=True)
+            self.socketdir = None
         self.log.removeHandler(self._log_fh)
         self._log_fh.close()
+
+
+class SharedQemuGdbTest(QemuGdbTest):
+    """
+    QemuGdbTest with one VM and GDB for the whole class. setUpClass boots them once
+    and the test methods run against the live machine in name order (test_task1,
+    test_task2, ...), each going on from where the previous one stopped it. A test
+    that fails a check leaves the machine usable and the next one still runs; after
+    a fatal failure (an error, a timeout, FatalFailure from fatal() or a dead guest)
+    the machine is not where the later tests start from, so they are skipped.
+    """
+
+    # the instance that owns the machine, which runs no test method of its own
+    _fixture: "SharedQemuGdbTest | None" = None
+    # id of the test that failed fatally, if any
+    _broken: str | None = None
+
+    @classmethod
+    def setUpClass(cls):
+        cls._broken = None
+        fixture = cls()
+        fixture.setUp()
+        cls._fixture = fixture
+
+    @classmethod
+    def tearDownClass(cls):
+        fixture, cls._fixture = cls._fixture, None
+        if fixture is not None:
+            fixture.tearDown()
+
+    def _is_fixture(self) -> bool:
+        return self._testMethodName == "runTest"
+
+    def id(self):
+        if self._is_fixture():
+            # logs and output directory of the shared machine are per class
+            return f"{type(self).__module__}.{type(self).__qualname__}"
+        return super().id()
+
+    def __getattr__(self, name):
+        # vm, gdb, log and so on come from the fixture
+        fixture = type(self)._fixture
+        if name.startswith("_") or fixture is None or fixture is self:
+            raise AttributeError(name)
+        return getattr(fixture, name)
+
+    def fatal(self, msg=None):
+        """
+        Fail the test and skip the remaining ones, e.g. when a check shows the kernel went off course.
+        """
+        raise FatalFailure(msg)
+
+    def setUp(self):
+        if self._is_fixture():
+            super().setUp()
+        elif type(self)._broken is not None:
+            self.skipTest(f"{type(self)._broken} failed, the machine is not in the state this test starts from")
+
+    def tearDown(self):
+        if self._is_fixture():
+            super().tearDown()
+
+    def _guard(self, method):
+        @functools.wraps(method)
+        def guarded(*args, **kwargs):
+            try:
+                return method(*args, **kwargs)
+            except unittest.SkipTest:
+                raise
+            except FatalFailure:
+                type(self)._broken = self.id()
+                raise
+            except self.failureException:
+                # a wrong value, the machine is where the next test expects it
+                raise
+            except BaseException:
+                type(self)._broken = self.id()
+                raise
+
+        return guarded
+
+    def run(self, result=None):
+        if not self._is_fixture():
+            # the instance attribute shadows the method for TestCase.run
+            setattr(self, self._testMethodName, self._guard(getattr(self, self._testMethodName)))
+        with timing.span(self, "phase", "test"):
+            return super().run(result)
+
+
+class QemuRspTest(QemuGdbTest):
+    """
+    QemuGdbTest without a GDB process. autograder.gdb talks to QEMU's gdbstub
+    through rsp.RspSession, resolving names with the ELF symbol table of vmlinux.
+    """
+
+    def checkout_from_pool(self):
+        # 池子里预热的是 GDB 进程，这里用不上
+        self.launch_vm()
+        self.launch_gdb()
+        self.run_to_kernel()
+
+    def launch_gdb(self):
+        self.attach_gdb_logs()
+        with timing.span(self, "phase", "launch_gdb"):
+            self.gdb = rsp.RspSession(self.gdb_log)
+        self.log.debug("Talking to the gdbstub without GDB")
+        self.connect_gdb(self.gdbstub()[1])
+
+    def connect_gdb(self, target: str, load_symbols: bool = True):
+        super().connect_gdb(target, load_symbols)
+        # register numbers are the gdbstub's, which need not be GDB's
+        self.gdb.cache_key = ["rsp", *self.gdb.cache_key]
+
+
+class AsyncQemuGdbTest(QemuGdbTest, unittest.IsolatedAsyncioTestCase):
+    """
+    QemuGdbTest for async test methods, which await the helpers in autograder.aio
+    to wait for GDB, console and QMP events concurrently.
+    """
+
+    def run_to_kernel(self):
+        # setUp runs before the test's event loop is started, so it can be driven from here
+        asyncio.get_event_loop().run_until_complete(self.async_run_to_kernel())
+
+    async def async_run_to_kernel(self):
+        with timing.span(self, "phase", "run_to_kernel"):
+            gdb.break_insert(self, gdb.locspec_address(0x80200000), temporary=True)
+            await asyncio.gather(aio.cont_sync(self), aio.wait_for_console_pattern(self, r"OpenSBI v"))
+
+    async def asyncTearDown(self):
+        aio.close_gdb_events(self)
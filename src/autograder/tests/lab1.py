@@ -1,31 +1,24 @@
 import autograder.gdb as g
 import autograder.qemu.console as c
 import autograder.qemu.monitor as m
-from autograder.testcase import QemuGdbTest
+from autograder.testcase import SharedQemuGdbTest
 
 
 def task1(self):
-    responses = g.break_insert(self, g.locspec_function("printk"), temporary=True)
-    bkpt_num = responses[0]["payload"]["bkpt"]["number"]
+    bkpt_num = g.break_insert(self, g.locspec_function("printk"), temporary=True).bkpt_number
     responses = g.cont_sync(self)
-    breakpoint_hit = False
-    if responses is None:
-        responses = g.sync(self)
-    for r in responses:
-        if r.get("type") == "notify" and r.get("message") == "stopped":
-            payload = r.get("payload", {})
-            if payload.get("reason") == "breakpoint-hit" and payload.get("bkptno") == bkpt_num:
-                breakpoint_hit = True
-    assert breakpoint_hit, "Breakpoint at printk was not hit"
+    if not responses.hit(bkpt_num):
+        self.fatal("Breakpoint at printk was not hit")
 
     scause = g.info_register(self, "scause")
     assert scause == "0x0", f"Expected scause to be 0x0, got {scause}"
 
 
 def task2(self):
-    for _ in range(5):
-        g.break_insert(self, g.locspec_function("printk"), temporary=True)
-        g.cont_sync(self)
+    with g.BreakpointSet(self) as bps:
+        (printk,) = bps.insert(g.locspec_function("printk"))
+        for _ in range(5):
+            bps.run_until([printk])
     c.wait_for_console_pattern(self, r"Hello, ZJU OS 2025!")
 
 
@@ -33,51 +26,35 @@ def task3(self):
     # check scause
     g.break_insert(self, g.locspec_function("_traps"), temporary=True)
     g.cont_sync(self)
-    c.wait_for_console_pattern(self, r"sstatus:")
-    c.wait_for_console_pattern(self, r"sie:")
-    c.wait_for_console_pattern(self, r"sip:")
-    scause = g.info_register(self, "scause")
-    assert scause == "0x8000000000000001", f"Expected scause to be 0x8000000000000001, got {scause}"
-    sip = g.info_register(self, "sip")
-    sip_val = int(sip, 16)
+    c.wait_for_console_patterns(self, ["sstatus:", "sie:", "sip:"])
+    regs = g.registers(self, ["scause", "sip", "sie"])
+    scause = regs["scause"]
+    assert scause == 0x8000000000000001, f"Expected scause to be 0x8000000000000001, got {scause:#x}"
+    sip_val = regs["sip"]
     assert sip_val & 0x2 == 0x2, f"Expected SSIP to be 1, got {(sip_val & 0x2) >> 1}"
-    sie = g.info_register(self, "sie")
-    sie_val = int(sie, 16)
+    sie_val = regs["sie"]
     assert sie_val & 0x2 == 0x2, f"Expected SSIE to be 1, got {(sie_val & 0x2) >> 1}"
 
     # back to start_kernel
-    g.break_insert(self, g.locspec_function("clock"), temporary=True)
-    responses = g.break_insert(self, g.locspec_function("_traps"), temporary=True)
-    bkpt_num = responses[0]["payload"]["bkpt"]["number"]
-    responses = g.cont_sync(self)
-    another_trap = False
-    if responses is None:
-        responses = g.sync(self)
-    for r in responses:
-        if r.get("type") == "notify" and r.get("message") == "stopped":
-            payload = r.get("payload", {})
-            if payload.get("reason") == "breakpoint-hit" and payload.get("bkptno") == bkpt_num:
-                another_trap = True
-    assert not another_trap, "Another trap occurred before reaching clock"
+    bps = g.BreakpointSet(self)
+    _, traps = bps.insert(g.locspec_function("clock"), g.locspec_function("_traps"), temporary=True)
+    hit = bps.run_until()
+    bps.close()
+    if hit is traps:
+        self.fatal("Another trap occurred before reaching clock")
 
 
 def task4(self):
     # check clock
-    responses = g.break_insert(self, g.locspec_function("clock"), temporary=True)
-    bkpt_num = responses[0]["payload"]["bkpt"]["number"]
+    bkpt_num = g.break_insert(self, g.locspec_function("clock"), temporary=True).bkpt_number
     responses = g.cont_sync(self)
-    breakpoint_hit = False
-    for r in responses:
-        if r.get("type") == "notify" and r.get("message") == "stopped":
-            payload = r.get("payload", {})
-            if payload.get("reason") == "breakpoint-hit":
-                if payload.get("bkptno") == bkpt_num:
-                    breakpoint_hit = True
-    assert breakpoint_hit, "Breakpoint at clock was not hit"
+    if not responses.hit(bkpt_num):
+        self.fatal("Breakpoint at clock was not hit")
 
     g.exec_finish(self)
-    time_end = int(g.data_evaluate_expression(self, "time_end")[0]["payload"]["value"])
-    time_start = int(g.data_evaluate_expression(self, "time_start")[0]["payload"]["value"])
+    g.sync(self)
+    time_end = int(g.data_evaluate_expression(self, "time_end").payload["value"])
+    time_start = int(g.data_evaluate_expression(self, "time_start").payload["value"])
     assert time_end - time_start > 0, "Expected time_end to be greater than time_start"
 
     # check sstatus
@@ -90,14 +67,16 @@ def task4(self):
     c.wait_for_console_pattern(self, r"timer interrupt")
 
 
-class Lab1Test(QemuGdbTest):
-    def test_lab1(self):
-        print("")
+class Lab1Test(SharedQemuGdbTest):
+    # each task goes on from where the previous one stopped the kernel
+    def test_task1(self):
         task1(self)
-        print("Task1 Passed")
+
+    def test_task2(self):
         task2(self)
-        print("Task2 Passed")
+
+    def test_task3(self):
         task3(self)
-        print("Task3 Passed")
+
+    def test_task4(self):
         task4(self)
-        print("Task4 Passed")
@@ -0,0 +1,98 @@
+"""
+Timing of test phases, GDB and QMP commands and console waits.
+
+Every span is recorded with its monotonic duration and the id of the test it ran for.
+At the end of a run main writes them to timing.json in the output directory and
+prints a summary table of where the time went.
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+records: list[dict] = []
+
+
+@contextmanager
+def span(test, kind: str, name: str, detail: str | None = None):
+    """
+    Time the body of the with statement as one record.
+    kind groups records ("phase", "gdb", "qmp", "console"), name identifies them within it.
+    """
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        records.append(
+            {
+                "test": test.id() if test is not None else None,
+                "kind": kind,
+                "name": name,
+                "detail": detail,
+                "start": start,
+                "duration": time.monotonic() - start,
+            }
+        )
+
+
+def take() -> list[dict]:
+    """
+    Remove and return the records collected so far, e.g. to send them out of a worker process.
+    """
+    taken = records[:]
+    del records[: len(taken)]
+    return taken
+
+
+def summary(recs: list[dict] | None = None) -> list[dict]:
+    """
+    Aggregate records by kind and name, slowest total first.
+    """
+    groups: dict[tuple[str, str], list[float]] = {}
+    for r in records if recs is None else recs:
+        groups.setdefault((r["kind"], r["name"]), []).append(r["duration"])
+    rows = [
+        {
+            "kind": kind,
+            "name": name,
+            "count": len(durations),
+            "total": sum(durations),
+            "mean": sum(durations) / len(durations),
+            "max": max(durations),
+        }
+        for (kind, name), durations in groups.items()
+    ]
+    rows.sort(key=lambda row: row["total"], reverse=True)
+    return rows
+
+
+def per_test(recs: list[dict] | None = None) -> dict[str, dict[str, float]]:
+    """
+    Total time per kind for each test, to spot slow submissions.
+    """
+    tests: dict[str, dict[str, float]] = {}
+    for r in records if recs is None else recs:
+        kinds = tests.setdefault(r["test"] or "", {})
+        kinds[r["kind"]] = kinds.get(r["kind"], 0.0) + r["duration"]
+    return tests
+
+
+def write_report(path: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"summary": summary(), "tests": per_test(), "records": records}, f, indent=2)
+
+
+def print_summary(stream=sys.stderr, limit: int = 20) -> None:
+    rows = summary()
+    if not rows:
+        return
+    stream.write(f"\n{'kind':<8} {'name':<32} {'count':>6} {'total':>9} {'mean':>9} {'max':>9}\n")
+    for row in rows[:limit]:
+        stream.write(
+            f"{row['kind']:<8} {row['name'][:32]:<32} {row['count']:>6} "
+            f"{row['total']:>8.3f}s {row['mean']:>8.3f}s {row['max']:>8.3f}s\n"
+        )
+    stream.flush()
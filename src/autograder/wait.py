@@ -0,0 +1,126 @@
+"""
+Waiting on GDB, the console and QEMU at once.
+
+gdb.sync alone only hears from GDB, so a kernel that panics or powers off
+instead of reaching the breakpoint used to cost a full wait_timeout. Here the
+GDB session's wakeup descriptor and the console socket are selected on
+together; QEMU's exit status and its QMP events are checked every
+config.frequency seconds, running the QMP client briefly each time so new
+events arrive. A failure event found there is taken off the machine's event
+queue. A wait returns on a *stopped record or a console
+match, and fails the test on a failure pattern, a failure event or QEMU exiting.
+"""
+
+import select
+import time
+from dataclasses import dataclass
+
+from .config import config
+from .qemu.console import ConsoleMatch, ConsoleMatcher, ConsoleTimeoutError, console_stream
+
+
+class FatalFailure(AssertionError):
+    """
+    A failure after which the machine is of no use to later checks, e.g. the guest panicked.
+    A SharedQemuGdbTest skips its remaining tests after one.
+    """
+
+
+@dataclass
+class Wakeup:
+    # "stopped" or "console"
+    reason: str
+    # events up to and including the *stopped record, for "stopped"
+    responses: object = None
+    # the success pattern that matched, for "console"
+    match: ConsoleMatch | None = None
+
+
+def _is_stopped(r) -> bool:
+    return r.type == "notify" and r.message == "stopped"
+
+
+# how long each check lets the QMP client run to receive events
+_QMP_POLL = 0.005
+
+
+def _check_qemu(vm) -> None:
+    if not vm.is_running():
+        raise FatalFailure(f"QEMU exited with code {vm.exitcode()}")
+    if config.failure_events:
+        # imported here, as autograder.gdb imports this module and is used without QEMU's python package
+        from .qemu.monitor import qmp_lock
+
+        # a zero timeout only looks at events already received; the client's event loop has to run
+        # for new ones to arrive. A matching event is taken off the machine's queue, others stay
+        with qmp_lock(vm):
+            try:
+                event = vm.events_wait([(name, None) for name in config.failure_events], _QMP_POLL)
+            except TimeoutError:
+                event = None
+        if event is not None:
+            raise FatalFailure(f"QEMU reported {event['event']}")
+
+
+def wait_any(test, stopped: bool = True, console=None, failure=None, vm=None, timeout=None) -> Wakeup:
+    """
+    Wait until GDB reports the target stopped (if stopped) or a console pattern in console shows up,
+    whichever comes first. Raises FatalFailure as soon as one of failure (config.console_failure_patterns
+    by default) shows up on the console, or QEMU exits or sends one of config.failure_events.
+    Without a VM (test.vm unset) this only waits for GDB.
+    """
+    assert stopped or console
+    if timeout is None:
+        timeout = config.wait_timeout
+    if failure is None:
+        failure = config.console_failure_patterns
+    if vm is None:
+        vm = getattr(test, "vm", None)
+    session = test.gdb if stopped else None
+    stream = console_stream(vm) if vm is not None else None
+    success = ConsoleMatcher(console, failure) if console else None
+    watch = ConsoleMatcher([], failure) if failure else None
+    # failures printed before the wait began count as well
+    since = stream.base + stream.consumed if stream is not None else 0
+
+    deadline = time.monotonic() + timeout
+    next_check = 0.0
+    while True:
+        if session is not None:
+            session.clear_wakeup()
+            try:
+                return Wakeup("stopped", responses=session.wait_event(_is_stopped, 0))
+            except TimeoutError:
+                pass
+        if stream is not None:
+            stream.poll()
+            if success is not None:
+                found = stream.search(success)
+                if found is not None and not found.failure:
+                    return Wakeup("console", match=found)
+            else:
+                found = None
+                if watch is not None:
+                    found, since = stream.peek(watch, since)
+            if found is not None:
+                raise FatalFailure(f"'{found.pattern}' found in console, last output:\n{stream.tail()}")
+            if stream.eof:
+                raise FatalFailure(f"EOF in console, last output:\n{stream.tail()}")
+        now = time.monotonic()
+        if vm is not None and now >= next_check:
+            _check_qemu(vm)
+            next_check = now + config.frequency
+        if now >= deadline:
+            if console and session is None:
+                raise ConsoleTimeoutError(success.success, timeout, stream.tail())
+            raise TimeoutError("Timeout waiting for GDB to stop" + (f" or for {console} on console" if console else ""))
+        fds = [f for f in (session, stream) if f is not None]
+        wait = deadline - now if vm is None else min(deadline - now, config.frequency)
+        select.select(fds, [], [], wait)
+
+
+def wait_stopped(test, timeout: float = config.wait_timeout):
+    """
+    Like GdbSession.wait_stopped, but failing early when the guest panics or QEMU goes away.
+    """
+    return wait_any(test, timeout=timeout).responses
@@ -0,0 +1,63 @@
+import re
+import unittest
+
+from autograder.qemu.console import ConsoleMatcher
+
+# (success, failure, output, expected (failure, index, text) of the earliest match or None)
+CASES = [
+    ("Hello", None, b"boot\nHello ZJU\n", (False, 0, b"Hello")),
+    (b"Hello", None, b"boot\nHello ZJU\n", (False, 0, b"Hello")),
+    ("a.b", None, b"axb a.b", (False, 0, b"a.b")),
+    ("Hello", None, b"hello", None),
+    (["first", "second"], None, b"second first", (False, 1, b"second")),
+    ("Hello", "panic", b"panic! Hello", (True, 0, b"panic")),
+    ("Hello", ["oops", "panic"], b"Hello panic", (False, 0, b"Hello")),
+    (re.compile(r"tick \d+"), None, b"tick x tick 12", (False, 0, b"tick 12")),
+    (re.compile(rb"^\[S\]", re.MULTILINE), None, b"x [S]\n[S] ok", (False, 0, b"[S]")),
+    (re.compile(r"(\w+) is \1"), None, b"ab is cd, xy is xy", (False, 0, b"xy is xy")),
+    (re.compile(r"(?P<n>\d+)/(?P=n)"), None, b"1/2 3/3", (False, 0, b"3/3")),
+    (re.compile(r"kernel panic", re.IGNORECASE), None, b"Kernel PANIC", (False, 0, b"Kernel PANIC")),
+    (re.compile(r"(?i)kernel panic"), None, b"Kernel PANIC", (False, 0, b"Kernel PANIC")),
+    (re.compile(rb"(?im)(?x) ^ oops \d"), None, b"a\nOOPS1", (False, 0, b"OOPS1")),
+    (re.compile(r"(?s)a.b"), None, b"a\nb", (False, 0, b"a\nb")),
+    (["Hello", re.compile(r"(?i)hel+o")], None, b"HELLO Hello", (False, 1, b"HELLO")),
+    (None, [re.compile(r"(?i)panic"), re.compile(r"(e)rror \1")], b"e e\nerror e", (True, 1, b"error e")),
+]
+
+
+class ConsoleMatcherTest(unittest.TestCase):
+    def test_cases(self):
+        for success, failure, output, expected in CASES:
+            with self.subTest(success=success, failure=failure, output=output):
+                found = ConsoleMatcher(success, failure).search(output)
+                if expected is None:
+                    self.assertIsNone(found)
+                else:
+                    self.assertIsNotNone(found)
+                    self.assertEqual((found.failure, found.index, found.text), expected)
+
+    def test_agrees_with_re(self):
+        pattern = re.compile(r"(?i)(?:ok|done) \[\d+\]")
+        output = b"ok [] DONE [42] ok [7]"
+        found = ConsoleMatcher(pattern).search(output)
+        m = re.compile(pattern.pattern.encode(), pattern.flags & ~re.UNICODE).search(output)
+        self.assertEqual((found.start, found.end), m.span())
+
+    def test_offsets(self):
+        matcher = ConsoleMatcher("Hello")
+        found = matcher.search(b"Hello Hello", pos=1, base=100)
+        self.assertEqual((found.start, found.end), (106, 111))
+        self.assertIs(found.pattern, matcher.success[0])
+
+    def test_earliest_wins_across_separate(self):
+        # the grouped pattern is searched on its own but still loses to an earlier match
+        matcher = ConsoleMatcher([re.compile(r"(x)\1"), "ab"])
+        self.assertEqual(matcher.search(b"ab xx").index, 1)
+        self.assertEqual(matcher.search(b"xx ab").index, 0)
+
+    def test_overlap(self):
+        self.assertEqual(ConsoleMatcher(["ab", "abcd"]).overlap, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
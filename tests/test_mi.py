@@ -0,0 +1,76 @@
+import unittest
+
+from pygdbmi import gdbmiparser
+
+from autograder.gdb.mi import parse_line
+from autograder.gdb.records import AsyncRecord, ResultRecord, StreamRecord
+
+# MI output as GDB prints it, covering every record kind and value shape
+LINES = [
+    "^done",
+    "^connected",
+    "^exit",
+    '12^done,bkpt={number="1",type="breakpoint",disp="keep",enabled="y",addr="0x0000000080200000",func="_start",'
+    'file="head.S",fullname="/k/head.S",line="9",thread-groups=["i1"],times="0",original-location="_start"}',
+    '*stopped,reason="breakpoint-hit",disp="keep",bkptno="1",frame={addr="0x80200000",func="_start",args=[],'
+    'file="head.S",line="9"},thread-id="1",stopped-threads="all"',
+    '*running,thread-id="all"',
+    '=thread-group-added,id="i1"',
+    '=breakpoint-modified,bkpt={number="2",times="1"}',
+    '~"Breakpoint 1 at 0x80200000: file head.S, line 9.\\n"',
+    '&"warning: \\"quoted\\"\\t\\\\ back\\n"',
+    '@"\\302\\240 octal"',
+    '3^error,msg="No symbol \\"foo\\" in current context."',
+    '^done,stack=[frame={level="0",addr="0x1"},frame={level="1",addr="0x2"}]',
+    '^done,register-values=[{number="1",value="0x0"},{number="2",value="0x80200000"}]',
+    '^done,value="{a = 1, b = \\"x\\"}"',
+    "^done,names=[]",
+    '^done,a={},b=[[],["1","2"]]',
+    '^done,x="1",x="2"',
+    "plain output line",
+]
+
+
+def _pygdbmi(line: str) -> dict:
+    parsed = gdbmiparser.parse_response(line)
+    return {key: parsed.get(key) for key in ("type", "message", "payload", "token")}
+
+
+class ParseLineTest(unittest.TestCase):
+    def test_matches_pygdbmi(self):
+        for line in LINES:
+            with self.subTest(line=line):
+                self.assertEqual(parse_line(line).to_dict(), _pygdbmi(line))
+
+    def test_record_classes(self):
+        self.assertIsInstance(parse_line('^done,value="1"'), ResultRecord)
+        self.assertIsInstance(parse_line('*stopped,reason="end-stepping-range"'), AsyncRecord)
+        self.assertIsInstance(parse_line('=thread-created,id="1"'), AsyncRecord)
+        self.assertIsInstance(parse_line('~"text\\n"'), StreamRecord)
+
+    def test_record_helpers(self):
+        r = parse_line('5^error,msg="No symbol table is loaded."')
+        self.assertEqual(r.token, 5)
+        self.assertEqual(r.error, "No symbol table is loaded.")
+        self.assertIsNone(parse_line("^done").error)
+        stopped = parse_line('*stopped,reason="breakpoint-hit",bkptno="3"')
+        self.assertEqual(stopped.reason, "breakpoint-hit")
+        self.assertTrue(stopped.hit(3))
+        self.assertFalse(stopped.hit("4"))
+
+    def test_keeps_line(self):
+        line = '~"hello\\n"'
+        r = parse_line(line)
+        self.assertEqual(r.line, line)
+        self.assertEqual(r.payload, "hello\n")
+
+    def test_malformed_is_output(self):
+        for line in ['^done,value="unterminated', "^done,value=", '~"no closing quote', "(gdb) "]:
+            with self.subTest(line=line):
+                r = parse_line(line)
+                self.assertEqual(r.type, "output")
+                self.assertEqual(r.payload, line)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+from unittest import mock
+
+try:
+    from autograder import memory, mm
+except ModuleNotFoundError:
+    # autograder.memory needs QEMU's python package
+    mm = None
+
+RAM = 0x80000000
+ROOT = 0x80001000
+L1 = 0x80002000
+L0 = 0x80003000
+# far from the other tables, so it takes a dump of its own
+L1_FAR = 0x80100000
+
+
+class PhysicalMemory:
+    """
+    Sparse physical memory standing in for QEMU's pmemsave.
+    """
+
+    def __init__(self):
+        self.pages: dict[int, bytearray] = {}
+        self.reads: list[tuple[int, int]] = []
+
+    def set_pte(self, table: int, index: int, pte: int) -> None:
+        page = self.pages.setdefault(table, bytearray(4096))
+        page[index * 8 : index * 8 + 8] = pte.to_bytes(8, "little")
+
+    def read(self, test, address: int, size: int, physical: bool = False) -> memoryview:
+        assert physical
+        self.reads.append((address, size))
+        data = bytearray()
+        for page in range(address, address + size, 4096):
+            data += self.pages.get(page, bytes(4096))
+        return memoryview(bytes(data))
+
+
+def _pte(pa: int, flags: int) -> int:
+    return (pa >> 12) << 10 | flags
+
+
+@unittest.skipIf(mm is None, "needs QEMU's python package")
+class PageTableTest(unittest.TestCase):
+    def setUp(self):
+        R, W, X, V = mm.PTE_R, mm.PTE_W, mm.PTE_X, mm.PTE_V
+        self.ram = PhysicalMemory()
+        # kernel gigapage 0xffffffe000000000 -> RAM
+        self.ram.set_pte(ROOT, 384, _pte(RAM, V | R | W | X | mm.PTE_G))
+        # user 4 KiB page 0x1000 -> 0x80200000, through two levels of tables
+        self.ram.set_pte(ROOT, 0, _pte(L1, V))
+        self.ram.set_pte(L1, 0, _pte(L0, V))
+        self.ram.set_pte(L0, 1, _pte(0x80200000, V | R | X | mm.PTE_U))
+        self.ram.set_pte(L0, 2, _pte(0x80201000, V | R | W | mm.PTE_U))
+        # 2 MiB megapage 0x40000000 -> 0x80400000, under a table far from the others
+        self.ram.set_pte(ROOT, 1, _pte(L1_FAR, V))
+        self.ram.set_pte(L1_FAR, 0, _pte(0x80400000, V | R))
+        patcher = mock.patch.object(memory, "read", self.ram.read)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        satp = mm.SATP_MODE_SV39 << 60 | ROOT >> 12
+        self.table = mm.PageTable(None, satp, 0)
+
+    def test_root(self):
+        self.assertEqual(self.table.root, ROOT)
+
+    def test_lookup_levels(self):
+        giga = self.table.lookup(0xFFFFFFE000123456)
+        self.assertEqual((giga.va, giga.pa, giga.size, giga.level), (0xFFFFFFE000000000, RAM, 1 << 30, 2))
+        self.assertTrue(giga.allows(mm.PTE_R | mm.PTE_W | mm.PTE_X))
+        page = self.table.lookup(0x1234)
+        self.assertEqual((page.va, page.pa, page.size, page.level), (0x1000, 0x80200000, 4096, 0))
+        self.assertFalse(page.allows(mm.PTE_W))
+        mega = self.table.lookup(0x40012345)
+        self.assertEqual((mega.va, mega.pa, mega.size, mega.level), (0x40000000, 0x80400000, 2 << 20, 1))
+
+    def test_unmapped(self):
+        self.assertIsNone(self.table.lookup(0x0))
+        self.assertIsNone(self.table.lookup(0x3000))
+        self.assertIsNone(self.table.lookup(0x80000000))
+        # not sign-extended from bit 38
+        self.assertIsNone(self.table.lookup(0x0000_0040_0000_0000))
+
+    def test_lookup_is_cached(self):
+        self.table.lookup(0x1000)
+        reads = len(self.ram.reads)
+        self.table.lookup(0x1000)
+        self.table.lookup(0x1FFF)
+        self.assertEqual(len(self.ram.reads), reads)
+
+    def test_mappings(self):
+        found = [(m.va, m.pa, m.size) for m in self.table.mappings()]
+        self.assertEqual(
+            found,
+            [
+                (0x1000, 0x80200000, 4096),
+                (0x2000, 0x80201000, 4096),
+                (0x40000000, 0x80400000, 2 << 20),
+                (0xFFFFFFE000000000, RAM, 1 << 30),
+            ],
+        )
+
+    def test_prefetch_batches_nearby_pages(self):
+        self.table.prefetch()
+        # the root, then L1 and L1_FAR in separate dumps as they are far apart, then L0
+        self.assertEqual(self.ram.reads, [(ROOT, 4096), (L1, 4096), (L1_FAR, 4096), (L0, 4096)])
+        self.table.mappings()
+        self.table.lookup(0x2000)
+        self.assertEqual(len(self.ram.reads), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
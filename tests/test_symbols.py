@@ -0,0 +1,96 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+from autograder import elf
+from autograder.symbols import SymbolIndex
+
+# an assembly label, a function with a local label inside and an object, like in a kernel image
+SOURCE = """
+    .text
+    .globl _traps
+_traps:
+    .skip 8
+    .globl f
+    .type f, @function
+f:
+    .skip 4
+local_label:
+    .skip 12
+    .size f, .-f
+    .skip 4
+    .data
+    .globl counter
+    .type counter, @object
+counter:
+    .quad 0
+    .size counter, 8
+"""
+
+
+@unittest.skipUnless(shutil.which("gcc"), "needs gcc to build the ELF")
+class SymbolIndexTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.dir = tempfile.mkdtemp()
+        source = os.path.join(cls.dir, "lab.S")
+        with open(source, "w") as f:
+            f.write(SOURCE)
+        cls.path = os.path.join(cls.dir, "lab")
+        subprocess.run(
+            ["gcc", "-nostdlib", "-static", "-Wl,-e,_traps", source, "-o", cls.path], check=True, capture_output=True
+        )
+        cls.index = SymbolIndex.from_elf(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.dir)
+
+    def test_lookup(self):
+        traps = self.index.lookup("_traps")
+        self.assertEqual(traps.type, elf.STT_NOTYPE)
+        f = self.index.lookup("f")
+        self.assertEqual((f.type, f.size), (elf.STT_FUNC, 16))
+        self.assertEqual(f.address, traps.address + 8)
+        self.assertEqual(self.index.lookup("counter").type, elf.STT_OBJECT)
+        self.assertEqual(self.index.lookup("local_label").address, f.address + 4)
+        self.assertIsNone(self.index.lookup("missing"))
+        self.assertEqual(self.index.address("f"), f.address)
+        with self.assertRaises(KeyError):
+            self.index.address("missing")
+
+    def test_symbolize(self):
+        traps = self.index.address("_traps")
+        f = self.index.address("f")
+        self.assertEqual(self.index.symbolize(traps).name, "_traps")
+        # code after a label that no sized symbol covers belongs to the label
+        self.assertEqual(self.index.symbolize(traps + 7).name, "_traps")
+        # labels inside a function do not hide it
+        self.assertEqual(self.index.symbolize(f).name, "f")
+        self.assertEqual(self.index.symbolize(f + 4).name, "f")
+        self.assertEqual(self.index.symbolize(f + 15).name, "f")
+        self.assertEqual(self.index.symbolize(f + 16).name, "local_label")
+        counter = self.index.address("counter")
+        self.assertEqual(self.index.symbolize(counter + 7).name, "counter")
+        # below the image there is no symbol at all
+        self.assertIsNone(self.index.symbolize(0x10))
+
+    def test_describe(self):
+        f = self.index.address("f")
+        self.assertEqual(self.index.describe(f), "f")
+        self.assertEqual(self.index.describe(f + 6), "f+6")
+        self.assertEqual(self.index.describe(self.index.address("_traps") + 2), "_traps+2")
+        self.assertEqual(self.index.describe(0x10), "0x10")
+
+    def test_dumps_loads(self):
+        loaded = SymbolIndex.loads(self.index.dumps())
+        self.assertEqual(len(loaded), len(self.index))
+        for name in ("_traps", "f", "local_label", "counter"):
+            self.assertEqual(loaded.lookup(name), self.index.lookup(name))
+        self.assertIsNone(SymbolIndex.loads(b"not an index"))
+
+
+if __name__ == "__main__":
+    unittest.main()